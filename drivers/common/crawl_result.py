@@ -0,0 +1,46 @@
+from typing import Optional
+
+
+class CrawlResult:
+    """
+    Represents the outcome of crawling a single website.
+    The stats are the Scrapy stats of the crawl, including the counters maintained by Crawlumbus (e.g. storage/*).
+    """
+
+    def __init__(self, site_name: Optional[str] = None, stats: Optional[dict] = None):
+        self._site_name = site_name
+        self._stats = stats if stats else {}
+
+    @property
+    def site_name(self):
+        return self._site_name
+
+    @site_name.setter
+    def site_name(self, value: str):
+        self._site_name = value
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @stats.setter
+    def stats(self, value: dict):
+        self._stats = value
+
+    @property
+    def num_pages(self) -> int:
+        return self.num_pages_written + self.num_pages_unchanged
+
+    @property
+    def num_pages_written(self) -> int:
+        return self.get_stat('storage/pages_written')
+
+    @property
+    def num_pages_unchanged(self) -> int:
+        return self.get_stat('storage/pages_unchanged')
+
+    def get_stat(self, key: str, default=0):
+        return self._stats.get(key, default)
+
+    def __str__(self):
+        return f'CrawlResult({self._site_name}, {self.num_pages})'
@@ -0,0 +1,59 @@
+from typing import List, Optional
+
+
+class DownloadResult:
+    """
+    Represents the outcome of downloading a batch of files, with the throughput of the batch.
+    """
+
+    def __init__(self, num_files: int = 0, num_bytes: int = 0, elapsed_seconds: float = 0.0,
+                 failed_urls: Optional[List[str]] = None):
+        self._num_files = num_files
+        self._num_bytes = num_bytes
+        self._elapsed_seconds = elapsed_seconds
+        self._failed_urls = failed_urls if failed_urls else []
+
+    @property
+    def num_files(self):
+        return self._num_files
+
+    @num_files.setter
+    def num_files(self, value: int):
+        self._num_files = value
+
+    @property
+    def num_bytes(self):
+        return self._num_bytes
+
+    @num_bytes.setter
+    def num_bytes(self, value: int):
+        self._num_bytes = value
+
+    @property
+    def elapsed_seconds(self):
+        return self._elapsed_seconds
+
+    @elapsed_seconds.setter
+    def elapsed_seconds(self, value: float):
+        self._elapsed_seconds = value
+
+    @property
+    def failed_urls(self):
+        return self._failed_urls
+
+    @failed_urls.setter
+    def failed_urls(self, value: List[str]):
+        self._failed_urls = value
+
+    @property
+    def files_per_second(self) -> float:
+        return self._num_files / self._elapsed_seconds if self._elapsed_seconds > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self._num_bytes / self._elapsed_seconds if self._elapsed_seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f'DownloadResult({self._num_files} files, {self._num_bytes} bytes in {self._elapsed_seconds:.1f}s, '
+                f'{self.files_per_second:.2f} files/s, {self.bytes_per_second / 1024 / 1024:.2f} MB/s, '
+                f'{len(self._failed_urls)} failed)')
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from drivers.crawler.utils.helper_methods import get_domain_without_extension
 
@@ -9,7 +9,9 @@ class InputElem:
     """
 
     def __init__(self, title: Optional[str] = None, url: Optional[str] = None, allowed_domains: Optional[str] = None,
-                 frequency: str = 'once', jurisdiction: Optional[str] = None, category: Optional[str] = None):
+                 frequency: str = 'once', jurisdiction: Optional[str] = None, category: Optional[str] = None,
+                 filter: Optional[str] = None, max_depth: int = -1, priority_patterns: Optional[List[str]] = None,
+                 low_priority_patterns: Optional[List[str]] = None):
         self._title = title
         self._url = url
         self._allowed_domains = allowed_domains if allowed_domains else self.get_root_domain(url)
@@ -17,6 +19,12 @@ class InputElem:
         self._jurisdiction = jurisdiction
         self._category = category
         self._site_name = get_domain_without_extension(self._url)
+        # The crawl frontier of the website crawls the links containing the filter and matching the priority patterns
+        # first, the links matching the low priority patterns last, and none deeper than max_depth (-1 for no limit).
+        self._filter = filter
+        self._max_depth = max_depth
+        self._priority_patterns = priority_patterns if priority_patterns else []
+        self._low_priority_patterns = low_priority_patterns if low_priority_patterns else []
 
     @property
     def site_name(self):
@@ -75,6 +83,38 @@ class InputElem:
     def jurisdiction(self, value: Optional[str]):
         self._jurisdiction = value
 
+    @property
+    def filter(self):
+        return self._filter
+
+    @filter.setter
+    def filter(self, value: Optional[str]):
+        self._filter = value
+
+    @property
+    def max_depth(self):
+        return self._max_depth
+
+    @max_depth.setter
+    def max_depth(self, value: int):
+        self._max_depth = value
+
+    @property
+    def priority_patterns(self):
+        return self._priority_patterns
+
+    @priority_patterns.setter
+    def priority_patterns(self, value: Optional[List[str]]):
+        self._priority_patterns = value if value else []
+
+    @property
+    def low_priority_patterns(self):
+        return self._low_priority_patterns
+
+    @low_priority_patterns.setter
+    def low_priority_patterns(self, value: Optional[List[str]]):
+        self._low_priority_patterns = value if value else []
+
     @staticmethod
     def get_root_domain(url: str):
         from urllib.parse import urlparse
@@ -91,4 +131,8 @@ class InputElem:
             'allowed_domains': self._allowed_domains,
             'frequency': self._frequency,
             'jurisdiction': self._jurisdiction,
+            'filter': self._filter,
+            'max_depth': self._max_depth,
+            'priority_patterns': self._priority_patterns,
+            'low_priority_patterns': self._low_priority_patterns,
         }
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Optional
+
+
+class S3Object:
+    """
+    Represents an object listed on S3 (see S3Client.iter_objects).
+    """
+
+    def __init__(self, bucket_name: str, key: str, size: int, etag: str, last_modified: Optional[datetime]):
+        self._bucket_name = bucket_name
+        self._key = key
+        self._size = size
+        self._etag = etag
+        self._last_modified = last_modified
+
+    @classmethod
+    def from_listing(cls, bucket_name: str, obj: dict) -> 'S3Object':
+        """
+        Creates the S3Object of an entry of the Contents of a list_objects_v2 response.
+        """
+        return cls(bucket_name, obj['Key'], obj.get('Size', 0), obj.get('ETag', '').strip('"'),
+                   obj.get('LastModified'))
+
+    @property
+    def bucket_name(self):
+        return self._bucket_name
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def etag(self):
+        return self._etag
+
+    @property
+    def last_modified(self):
+        return self._last_modified
+
+    @property
+    def s3_path(self) -> str:
+        return f's3://{self._bucket_name}/{self._key}'
+
+    def __str__(self):
+        return f'S3Object({self.s3_path}, {self._size} bytes, {self._etag}, {self._last_modified})'
@@ -1,12 +1,18 @@
 # Indexer reads data from a database and indexes it into the search engine.
 # To start with, we will assume that there is a single directory in S3 where all the PDFs are stored.
 # These PDFs will then be sent to our Search Index in Elastic.
+import logging
+import os
 from logging.config import dictConfig
+from typing import Optional
 
+from drivers.utilities.extraction_cache import ExtractionCache
 from drivers.utilities.file import File
-from drivers.utilities.s3_client import S3Client
+from drivers.utilities.pdf_extractor import DEFAULT_TIMEOUT_SECONDS, PdfExtractor
 
 MAX_DOCUMENTS_TO_INDEX = 1
+# The directory of the cache of the text extracted from the documents, e.g. a directory shared by the indexers.
+EXTRACTION_CACHE_DIR = os.environ.get('EXTRACTION_CACHE_DIR', os.path.join(os.getcwd(), 'cache', 'extraction'))
 
 dictConfig({
     'version': 1,
@@ -28,15 +34,22 @@ dictConfig({
 class Indexer:
     """
     Indexer reads data from a database and indexes it into the search engine.
+
+    @pdf_workers: The number of processes extracting the text of a PDF, None for the number of CPUs.
+    @pdf_timeout_seconds: The time after which the extraction of a PDF is abandoned.
+    @extraction_cache_dir: The directory of the cache of the extracted text, None to disable it.
     """
-    def __init__(self, src_dir: str, es_end_point: str):
+    def __init__(self, src_dir: str, es_end_point: str, pdf_workers: Optional[int] = None,
+                 pdf_timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+                 extraction_cache_dir: Optional[str] = EXTRACTION_CACHE_DIR):
         self.num_docs_indexed = 0
         self.source_dir = src_dir
         # For now, we will hit the POST API on Decover Master.
         # @app.route('/api/v1/documents', methods=['POST'])
         self.es_end_point = es_end_point
-        self.file_reader = File()
-        self.s3_client = S3Client()
+        self.pdf_extractor = PdfExtractor(max_workers=pdf_workers, timeout_seconds=pdf_timeout_seconds)
+        self.extraction_cache = ExtractionCache(extraction_cache_dir) if extraction_cache_dir else None
+        self.file_reader = File(pdf_extractor=self.pdf_extractor, extraction_cache=self.extraction_cache)
         self.file_to_contents_map = {}
 
     def run(self):
@@ -44,7 +57,12 @@ class Indexer:
         Run the indexer.
         :return:
         """
-        self.__read_documents()
+        try:
+            self.__read_documents()
+        finally:
+            self.pdf_extractor.close()
+        if self.extraction_cache is not None:
+            logging.info(f'Extraction cache: {self.extraction_cache.get_stats()}')
         self.__index_to_elastic()
         pass
 
@@ -57,7 +75,7 @@ class Indexer:
 
     def __read_documents(self):
         # Read all the files from the source directory in S3.
-        files = self.s3_client.list_files(self.source_dir)
+        files = self.file_reader.iter_files(self.source_dir)
         # Iterate over the files and index them.
         for file in files:
             file_path = f'{self.source_dir}/{file}'
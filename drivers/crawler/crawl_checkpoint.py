@@ -0,0 +1,116 @@
+import logging
+import os
+import pickle
+import re
+import time
+from typing import List, Optional
+
+CHECKPOINT_FILE_EXTENSION = '.checkpoint'
+# The interval at which the crawls in progress update their checkpoint.
+CHECKPOINT_INTERVAL_SECONDS = 30
+# The checkpoints updated more recently than this belong to crawls that are likely still running, and are never
+# discarded as stale.
+LIVE_CHECKPOINT_SECONDS = 3 * CHECKPOINT_INTERVAL_SECONDS
+# The age beyond which a checkpoint is not resumed anymore: the website has likely changed too much since, and the
+# crawl starts over.
+MAX_CHECKPOINT_AGE_SECONDS = 7 * 24 * 3600
+
+
+def get_checkpoint_key(target_directory: str) -> str:
+    """
+    Returns the name of the checkpoint of the website crawled to @target_directory.
+    """
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', target_directory).strip('_')
+
+
+class CrawlCheckpointStore:
+    """
+    Stores the checkpoints of the crawls in progress on the local disk, one file per website.
+
+    A checkpoint holds everything a crawl needs to resume where it stopped: the frontier (the requests that were
+    scheduled but not completed), the seen-set, the number of pages completed, the metadata rows of the pages
+    already stored and the stats of the crawl. Checkpoints are written atomically, so an interrupted write never
+    corrupts the previous one. The checkpoints older than @max_age_seconds are discarded instead of being resumed.
+
+    @directory: The directory of the checkpoints.
+    @max_age_seconds: The age beyond which a checkpoint is not resumed anymore.
+    """
+
+    def __init__(self, directory: str, max_age_seconds: float = MAX_CHECKPOINT_AGE_SECONDS):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+
+    def save(self, key: str, state: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.__get_path(key)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'key': key, 'updated_at': time.time(), 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, key: str) -> Optional[dict]:
+        """
+        Returns the state of the checkpoint @key or None if there is no (readable) checkpoint, or if it is older than
+        max_age_seconds.
+        """
+        path = self.__get_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                checkpoint = pickle.load(f)
+        except Exception as e:
+            logging.error(f'Discarding the unreadable checkpoint {path}: {e}')
+            self.discard(key)
+            return None
+        age_seconds = time.time() - checkpoint['updated_at']
+        if age_seconds > self.max_age_seconds:
+            logging.info(f'Discarding the checkpoint {path}, {age_seconds / 3600:.1f} hours old: the crawl starts over')
+            self.discard(key)
+            return None
+        return checkpoint['state']
+
+    def discard(self, key: str) -> None:
+        path = self.__get_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list_checkpoints(self) -> List[dict]:
+        """
+        Lists the checkpoints of the store.
+        :return: A list of {key, updated_at, age_seconds, size_bytes} dictionaries, the oldest first.
+        """
+        if not os.path.exists(self.directory):
+            return []
+        checkpoints = []
+        now = time.time()
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(CHECKPOINT_FILE_EXTENSION):
+                continue
+            path = os.path.join(self.directory, file_name)
+            updated_at = os.path.getmtime(path)
+            checkpoints.append({
+                'key': file_name[:-len(CHECKPOINT_FILE_EXTENSION)],
+                'updated_at': updated_at,
+                'age_seconds': int(now - updated_at),
+                'size_bytes': os.path.getsize(path)
+            })
+        return sorted(checkpoints, key=lambda checkpoint: checkpoint['updated_at'])
+
+    def discard_stale(self, max_age_seconds: float) -> List[str]:
+        """
+        Discards the checkpoints that were not updated for more than @max_age_seconds. The checkpoints updated in the
+        last LIVE_CHECKPOINT_SECONDS are kept whatever @max_age_seconds, as their crawls are likely still running.
+        :return: The keys of the discarded checkpoints.
+        """
+        max_age_seconds = max(max_age_seconds, LIVE_CHECKPOINT_SECONDS)
+        stale_keys = [checkpoint['key'] for checkpoint in self.list_checkpoints()
+                      if checkpoint['age_seconds'] >= max_age_seconds]
+        for key in stale_keys:
+            self.discard(key)
+        if stale_keys:
+            logging.info(f'Discarded {len(stale_keys)} stale checkpoints from {self.directory}')
+        return stale_keys
+
+    def __get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}{CHECKPOINT_FILE_EXTENSION}')
@@ -0,0 +1,97 @@
+import heapq
+import re
+from typing import List, Optional, Tuple
+
+# The URLs of pages that are rarely worth the budget of a crawl: pagination, calendars, date archives, sorted or
+# printable views of the same page, tags, searches and logins.
+DEFAULT_LOW_PRIORITY_URL_PATTERNS = [
+    r'[?&](page|pg|p|offset|start)=\d+',
+    r'/page/\d+',
+    r'calendar|/events?(/|$)',
+    r'/\d{4}/\d{1,2}(/\d{1,2})?(/|$)',
+    r'[?&](sort|order|view|print|share|replytocom)=',
+    r'/(tag|tags|search|login|signin|register)(/|\?|$)'
+]
+
+# The score of a link is its depth from the seed, minus the bonuses below. The links with the lowest score are
+# crawled first, e.g. a link matching the priority patterns at depth 4 comes before a link not matching them at
+# depth 1.
+PRIORITY_PATTERN_BONUS = 4
+LOW_PRIORITY_PATTERN_PENALTY = 8
+
+
+class CrawlFrontier:
+    """
+    The links discovered on a website but not requested yet, ordered by their score so that the page budget of the
+    crawl goes to the most valuable pages first.
+
+    The score of a link is based on:
+    1. Its depth from the seed: the shallow pages come first.
+    2. Whether it matches the priority patterns (e.g. the statute sections) or the low priority patterns (e.g. the
+    pagination and the calendars) of the website.
+    The links deeper than @max_depth are not crawled at all. The links with the same score are crawled in the order
+    they were discovered. The frontier only orders the links: the links not containing the filter of the website are
+    never added to it (see DecoverSpider).
+
+    @max_depth: The maximum depth of the pages crawled from the seed, -1 for no limit.
+    @priority_patterns: The regular expressions of the links crawled first.
+    @low_priority_patterns: The regular expressions of the links crawled last, in addition to the
+    DEFAULT_LOW_PRIORITY_URL_PATTERNS.
+    """
+
+    def __init__(self, max_depth: int = -1, priority_patterns: Optional[List[str]] = None,
+                 low_priority_patterns: Optional[List[str]] = None):
+        self.max_depth = max_depth if max_depth is not None else -1
+        self.priority_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in priority_patterns or []]
+        self.low_priority_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in
+                                      DEFAULT_LOW_PRIORITY_URL_PATTERNS + (low_priority_patterns or [])]
+        # A heap of (score, sequence, url, depth) entries.
+        self._heap = []
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def is_too_deep(self, depth: int) -> bool:
+        return 0 <= self.max_depth < depth
+
+    def score(self, url: str, depth: int) -> int:
+        """
+        Returns the score of @url found at @depth, the lower the better.
+        """
+        score = depth
+        if any(pattern.search(url) for pattern in self.priority_patterns):
+            score -= PRIORITY_PATTERN_BONUS
+        if any(pattern.search(url) for pattern in self.low_priority_patterns):
+            score += LOW_PRIORITY_PATTERN_PENALTY
+        return score
+
+    def push(self, url: str, depth: int) -> bool:
+        """
+        Adds @url found at @depth to the frontier.
+        :return: False if the URL is deeper than max_depth and was not added, True otherwise.
+        """
+        if self.is_too_deep(depth):
+            return False
+        heapq.heappush(self._heap, (self.score(url, depth), self._sequence, url, depth))
+        self._sequence += 1
+        return True
+
+    def pop(self) -> Tuple[str, int, int]:
+        """
+        Removes the link with the lowest score from the frontier.
+        :return: The (url, depth, score) of the link.
+        """
+        score, _, url, depth = heapq.heappop(self._heap)
+        return url, depth, score
+
+    def to_list(self) -> List[tuple]:
+        return list(self._heap)
+
+    def restore(self, entries: List[tuple]) -> None:
+        """
+        Restores the links returned by to_list(), e.g. from a checkpoint.
+        """
+        self._heap = [tuple(entry) for entry in entries]
+        heapq.heapify(self._heap)
+        self._sequence = max((entry[1] for entry in self._heap), default=-1) + 1
@@ -0,0 +1,222 @@
+import collections
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import Process, Queue
+
+# How often (in seconds) the collector thread checks that the workers are still alive.
+_WORKER_HEALTH_CHECK_SECONDS = 1.0
+# How long (in seconds) shutdown() waits for the workers to finish their crawls before terminating them.
+_SHUTDOWN_TIMEOUT_SECONDS = 3600.0
+
+
+def _run_worker(worker_id: int, settings: dict, max_concurrent_crawls: int, task_queue: Queue, result_queue: Queue):
+    """
+    Entry point of a crawl worker process. The worker keeps a single Twisted reactor alive and runs every crawl it
+    receives on it, so Scrapy and the reactor are only started once per worker instead of once per website.
+    :param worker_id: The index of the worker in the pool.
+    :param settings: The Scrapy settings shared by all the crawls of the worker.
+    :param max_concurrent_crawls: The maximum number of crawls the worker runs at the same time.
+    :param task_queue: The queue the crawl jobs of this worker are read from.
+    :param result_queue: The queue the results of the crawls are written to.
+    :return:
+    """
+    import scrapy.crawler as crawler
+    from twisted.internet import reactor
+
+    runner = crawler.CrawlerRunner(settings=settings)
+    reactor.suggestThreadPoolSize(runner.settings.getint('REACTOR_THREADPOOL_MAXSIZE'))
+    slots = threading.BoundedSemaphore(max_concurrent_crawls)
+
+    def on_crawl_finished(failure, job_id, scrapy_crawler):
+        stats = scrapy_crawler.stats.get_stats() if scrapy_crawler.stats else {}
+        error = None
+        if failure is not None:
+            # Twisted failures (and the exceptions they wrap) are not always picklable.
+            error = Exception(f'{failure.type.__name__}: {failure.getErrorMessage()}')
+        result_queue.put((job_id, stats, error))
+        slots.release()
+
+    def start_crawl(job_id, spider_cls, spider_kwargs):
+        scrapy_crawler = runner.create_crawler(spider_cls)
+        deferred = runner.crawl(scrapy_crawler, **spider_kwargs)
+        deferred.addCallbacks(lambda _: on_crawl_finished(None, job_id, scrapy_crawler),
+                              lambda failure: on_crawl_finished(failure, job_id, scrapy_crawler))
+
+    def stop():
+        runner.join().addBoth(lambda _: reactor.stop())
+
+    def feed_jobs():
+        # Runs in a thread: blocks on the task queue and hands the jobs over to the reactor thread.
+        while True:
+            slots.acquire()
+            task = task_queue.get()
+            if task is None:
+                reactor.callFromThread(stop)
+                return
+            job_id, spider_cls, spider_kwargs = task
+            reactor.callFromThread(start_crawl, job_id, spider_cls, spider_kwargs)
+
+    reactor.callWhenRunning(lambda: threading.Thread(target=feed_jobs, daemon=True).start())
+    reactor.run(installSignalHandlers=False)
+
+
+class CrawlWorkerPool:
+    """
+    A pool of long-lived crawl worker processes.
+
+    Each worker keeps one Twisted reactor running and executes many crawls on it, either one after another or
+    concurrently (up to @crawls_per_worker at a time). Crawls are dispatched with submit(), which returns a Future
+    that resolves to the Scrapy stats of the crawl once it is done.
+
+    Each worker has its own task queue, and every job is handed to the worker with the fewest jobs in progress, so
+    that the pool always knows which worker holds a job: when a worker dies, the futures of all its jobs, started or
+    still queued, are failed before it is replaced.
+    """
+
+    def __init__(self, settings: dict, num_workers: int = 1, crawls_per_worker: int = 1):
+        self.settings = settings
+        self.num_workers = max(1, num_workers)
+        self.crawls_per_worker = max(1, crawls_per_worker)
+        self._task_queues = []
+        self._result_queue = None
+        self._workers = []
+        self._job_ids = itertools.count()
+        self._futures = {}
+        self._job_to_worker = {}
+        self._lock = threading.Lock()
+        self._collector = None
+        self._running = False
+        self._stopping = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        """
+        Starts the worker processes and the thread that collects their results.
+        :return:
+        """
+        if self._running:
+            return
+        self._result_queue = Queue()
+        self._task_queues = [Queue() for _ in range(self.num_workers)]
+        self._workers = [self.__spawn_worker(worker_id) for worker_id in range(self.num_workers)]
+        self._running = True
+        self._stopping = False
+        self._collector = threading.Thread(target=self.__collect_results, daemon=True)
+        self._collector.start()
+        logging.info(f'Started {self.num_workers} crawl workers with {self.crawls_per_worker} crawls per worker.')
+
+    def submit(self, spider_cls, **spider_kwargs) -> Future:
+        """
+        Dispatches a crawl to the pool.
+        :param spider_cls: The spider to run.
+        :param spider_kwargs: The arguments passed to the spider.
+        :return: A Future that resolves to the Scrapy stats of the crawl.
+        """
+        if not self._running:
+            raise Exception('The crawl worker pool is not running.')
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            job_id = next(self._job_ids)
+            self._futures[job_id] = future
+            worker_loads = collections.Counter(self._job_to_worker.values())
+            worker_id = min(range(self.num_workers), key=lambda worker_id: worker_loads[worker_id])
+            self._job_to_worker[job_id] = worker_id
+            # Under the lock, so that the job is not put on the queue of a worker being replaced.
+            self._task_queues[worker_id].put((job_id, spider_cls, spider_kwargs))
+        return future
+
+    def shutdown(self, timeout: float = _SHUTDOWN_TIMEOUT_SECONDS) -> None:
+        """
+        Waits for the submitted crawls to finish and stops the workers.
+        :param timeout: How long to wait for the workers to finish their crawls. The workers still running after it
+        (e.g. hung in a crawl) are terminated and their crawls fail.
+        :return:
+        """
+        if not self._running:
+            return
+        self._stopping = True
+        with self._lock:
+            for task_queue in self._task_queues:
+                task_queue.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+        for worker_id, worker in enumerate(self._workers):
+            if not worker.is_alive():
+                continue
+            logging.error(f'Crawl worker {worker_id} did not stop within {timeout}s. Terminating it.')
+            worker.terminate()
+            worker.join()
+            with self._lock:
+                lost_jobs = [job_id for job_id, owner in self._job_to_worker.items() if owner == worker_id]
+                for job_id in lost_jobs:
+                    del self._job_to_worker[job_id]
+                    self._futures.pop(job_id).set_exception(
+                        Exception(f'Crawl worker {worker_id} was terminated at shutdown after {timeout}s.'))
+        self._running = False
+        self._collector.join()
+        # Fail whatever could not be completed (e.g. because a worker died).
+        with self._lock:
+            for future in self._futures.values():
+                future.set_exception(Exception('The crawl worker pool was shut down.'))
+            self._futures.clear()
+            self._job_to_worker.clear()
+        logging.info('Stopped the crawl workers.')
+
+    def __spawn_worker(self, worker_id: int) -> Process:
+        worker = Process(target=_run_worker,
+                         args=(worker_id, self.settings, self.crawls_per_worker, self._task_queues[worker_id],
+                               self._result_queue),
+                         daemon=True)
+        worker.start()
+        return worker
+
+    def __collect_results(self):
+        while self._running or not self._result_queue.empty():
+            try:
+                message = self._result_queue.get(timeout=_WORKER_HEALTH_CHECK_SECONDS)
+            except queue.Empty:
+                if self._running and not self._stopping:
+                    self.__replace_dead_workers()
+                continue
+            job_id, stats, error = message
+            with self._lock:
+                future = self._futures.pop(job_id, None)
+                self._job_to_worker.pop(job_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(stats)
+
+    def __replace_dead_workers(self):
+        for worker_id, worker in enumerate(self._workers):
+            if worker.is_alive() or worker.exitcode == 0:
+                continue
+            logging.error(f'Crawl worker {worker_id} died with exit code {worker.exitcode}. Restarting it.')
+            with self._lock:
+                # The jobs still in the queue of the worker are lost with it too, and the queue may have been left
+                # locked by the worker: replace it along with the worker.
+                lost_jobs = [job_id for job_id, owner in self._job_to_worker.items() if owner == worker_id]
+                for job_id in lost_jobs:
+                    del self._job_to_worker[job_id]
+                    self._futures.pop(job_id).set_exception(
+                        Exception(f'Crawl worker {worker_id} died with exit code {worker.exitcode}.'))
+                self._task_queues[worker_id] = Queue()
+                self._workers[worker_id] = self.__spawn_worker(worker_id)
@@ -1,8 +1,20 @@
+import hashlib
 import logging
+import time
 
 import scrapy
+from scrapy import signals
+from scrapy.exceptions import CloseSpider, DontCloseSpider
+from scrapy.http import TextResponse
+from twisted.internet import defer, task, threads
 
-from drivers.crawler.utils.helper_methods import get_text_from_html, get_pdf_links, download_pdf
+from drivers.crawler.crawl_checkpoint import CHECKPOINT_INTERVAL_SECONDS, CrawlCheckpointStore, get_checkpoint_key
+from drivers.crawler.crawl_frontier import CrawlFrontier
+from drivers.crawler.page_history import PageHistory
+from drivers.crawler.response_guard import has_skipped_extension, has_unknown_extension, is_html_content_type
+from drivers.crawler.utils.helper_methods import download_pdf, is_url_in_domains
+from drivers.crawler.utils.html_extractor import extract_page
+from drivers.crawler.utils.url_canonicalizer import UrlSeenSet, canonicalize_url
 
 
 class DecoverSpider(scrapy.Spider):
@@ -14,8 +26,18 @@ class DecoverSpider(scrapy.Spider):
                  should_recurse=True,
                  max_links=10,
                  download_pdfs=False,
-                 file_name='items.jsonl',
+                 target_directory=None,
+                 page_metadata=None,
                  filter=None,
+                 strict_page_budget=True,
+                 incremental=False,
+                 checkpoint_dir=None,
+                 checkpoint_interval=CHECKPOINT_INTERVAL_SECONDS,
+                 max_depth=-1,
+                 priority_patterns=None,
+                 low_priority_patterns=None,
+                 max_response_bytes=None,
+                 probe_unknown_types=False,
                  *args, **kwargs):
         super(DecoverSpider, self).__init__(*args, **kwargs)
         self.allowed_domains = allowed_domains
@@ -23,39 +45,338 @@ class DecoverSpider(scrapy.Spider):
         self.should_recurse = should_recurse
         self.max_links = max_links
         self.should_download_pdf = download_pdfs
-        self.file = file_name
+        # The directory where the StoragePipeline writes the pages and their metadata.
+        self.target_directory = target_directory
+        self.page_metadata = page_metadata if page_metadata else {}
         self.filter = filter
+        # When the page budget is strict, max_links is the exact number of pages to crawl: the requests in flight
+        # plus the pages completed never exceed it, so no request is scheduled only to be thrown away.
+        self.strict_page_budget = strict_page_budget
+        self.pages_completed = 0
+        # The links discovered but not requested yet, the best first. Only max_requests_in_flight of them are
+        # requested at a time, so that the links discovered later still compete for the budget.
+        self.frontier = CrawlFrontier(max_depth, priority_patterns, low_priority_patterns)
+        self.max_requests_in_flight = 16
+        # The URLs requested but not parsed yet (with their depth), and the URLs parsed but not stored yet.
+        self.pending_urls = {}
+        self.unstored_urls = {}
+        # The metadata rows of the pages stored by the StoragePipeline.
+        self.metadata_rows = []
+        # The canonical URLs added to the frontier so far. Scrapy's dupe filter is disabled (see CRAWLER_SETTINGS),
+        # this set is the only one and it stays small on large websites.
+        self.seen_urls = UrlSeenSet()
+        self.parse_seconds = 0.0
+        # In incremental mode, the pages that did not change since the previous crawl are neither extracted nor
+        # uploaded again.
+        self.page_history = PageHistory(target_directory) if incremental else None
+        # The crawl is checkpointed to the local disk every checkpoint_interval seconds, so that an interrupted
+        # crawl resumes where it stopped instead of starting over.
+        self.checkpoint_store = CrawlCheckpointStore(checkpoint_dir) if checkpoint_dir else None
+        self.checkpoint_key = get_checkpoint_key(target_directory) if target_directory else self.name
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_loop = None
+        self.resumed_requests = None
+        # The links to images, archives, videos... are never requested and the responses that are not web pages or
+        # are too large are aborted by the ResponseGuard. When probe_unknown_types is set, a HEAD request checks the
+        # content type of the links with an unknown extension before they are downloaded.
+        self.max_response_bytes = max_response_bytes
+        self.probe_unknown_types = probe_unknown_types
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(DecoverSpider, cls).from_crawler(crawler, *args, **kwargs)
+        crawler.signals.connect(spider.request_dropped, signal=signals.request_dropped)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        spider.max_requests_in_flight = crawler.settings.getint('CONCURRENT_REQUESTS')
+        return spider
+
+    def spider_opened(self, spider):
+        if spider is not self:
+            return
+        deferred = threads.deferToThread(self.__load_state)
+        deferred.addCallback(self.__restore_checkpoint)
+        return deferred
+
+    def spider_idle(self, spider):
+        # Requests were dropped or failed without a page to dispatch the next links of the frontier from.
+        if spider is not self:
+            return
+        requests = list(self.__dispatch())
+        for request in requests:
+            self.crawler.engine.crawl(request)
+        if requests:
+            raise DontCloseSpider
 
     @property
-    def file_name(self):
-        return self.file
+    def requests_in_flight(self) -> int:
+        return len(self.pending_urls)
+
+    @property
+    def budget_left(self) -> int:
+        return self.max_links - self.pages_completed - self.requests_in_flight
+
+    def start_requests(self):
+        if self.resumed_requests is not None:
+            # Resume from the checkpoint: request again the URLs that were pending when it was saved.
+            for url, depth in self.resumed_requests.items():
+                self.pending_urls[url] = depth
+                yield self.__build_request(url, depth, self.frontier.score(url, depth))
+        else:
+            for url in self.start_urls:
+                self.__add_to_frontier(url, 0)
+        yield from self.__dispatch()
 
     def parse(self, response):  # noqa
+        self.__complete_request(response.request)
         # Bail out if the page limit is reached.
-        if self.max_links <= 0:
+        if not self.strict_page_budget and self.max_links <= 0:
+            return
+        # Bail out if the request was redirected to a page that was already crawled.
+        if self.__is_redirect_to_seen_url(response):
+            self.crawler.stats.inc_value('dedup/duplicate_redirects')
+            yield from self.__dispatch()
+            return
+        # Bail out if the response is not a web page and its type could not be told from its headers.
+        if not isinstance(response, TextResponse) and response.status != 304:
+            self.crawler.stats.inc_value('guards/responses_not_html')
+            yield from self.__dispatch()
             return
 
         logging.debug(f"Processing {response.url}")
-        # Step I: Extract the text from the webpage
-        text_html = response.xpath('//body').get()
-
-        # Step II: Create a dictionary to store the results for this page.
-        #          It will be a key-value pair of {url: text}.
-        text = get_text_from_html(text_html)
-        if self.should_download_pdf:
-            pdf_links = get_pdf_links(text_html, self.filter)
-            for pdf_link in pdf_links:
-                download_pdf(pdf_link['href'])
-        result = {response.url: text}
-        self.max_links -= 1
-
-        # Step III: Follow all the hyperlinks in the same domain including pdfs as well.
-        if self.should_recurse and self.max_links > 0:
-            for link in response.xpath('//a/@href'):
-                url = response.urljoin(link.extract())
-                # Check if the domain is allowed.
-                if any(domain in url for domain in self.allowed_domains):
-                    # Check if the filter is a prefix of the url.
-                    if self.filter in url:
-                        yield scrapy.Request(url, callback=self.parse)
+        parse_start = time.process_time()
+        history = self.page_history.get(response.url) if self.page_history is not None else None
+        body_hash = hashlib.md5(response.body).hexdigest()
+        if history is not None and (response.status == 304 or history['body_hash'] == body_hash):
+            # The page did not change: skip the extraction and follow the links of the previous crawl.
+            self.crawler.stats.inc_value('incremental/pages_not_modified')
+            text, text_hash, links = None, history['hash'], history['links']
+            body_hash = history['body_hash']
+        else:
+            # Step I: Parse the webpage once, from the lxml tree Scrapy already built, into its text and links.
+            page = extract_page(response.selector.root, self.filter)
+
+            # Step II: Create an item with the results for this page.
+            text = page.text
+            text_hash = hashlib.md5(text.encode()).hexdigest()
+            if self.should_download_pdf:
+                for pdf_link in page.pdf_links:
+                    download_pdf(pdf_link)
+            links = self.__filter_links(response, page.links)
+        result = {
+            'url': response.url,
+            'text': text,
+            # The page is not uploaded again when its text did not change.
+            'unchanged': history is not None and history['hash'] == text_hash,
+            'etag': response.headers.get('ETag', b'').decode() or (history or {}).get('etag'),
+            'last_modified': response.headers.get('Last-Modified', b'').decode() or (history or {}).get(
+                'last_modified'),
+            'body_hash': body_hash,
+            'hash': text_hash,
+            'links': links
+        }
+        self.pages_completed += 1
+        self.unstored_urls[response.url] = response.meta.get('frontier_depth', 0)
+        if not self.strict_page_budget:
+            self.max_links -= 1
+
+        # Step III: Add all the hyperlinks in the same domain to the frontier and request the best ones.
+        if self.should_recurse and (self.strict_page_budget or self.max_links > 0):
+            depth = response.meta.get('frontier_depth', 0) + 1
+            for url in links:
+                self.__add_to_frontier(url, depth)
+        requests = list(self.__dispatch())
+        self.parse_seconds += time.process_time() - parse_start
+        yield from requests
         yield result
+
+        # Stop as soon as the budget is met: nothing is in flight anymore.
+        if self.strict_page_budget and self.pages_completed >= self.max_links:
+            raise CloseSpider('page_budget_reached')
+
+    def parse_probe(self, response):
+        # The response of the HEAD request of a link with an unknown extension: download it if it is a web page.
+        url, depth = response.meta['frontier_url'], response.meta['frontier_depth']
+        if is_html_content_type(response.headers.get('Content-Type')):
+            yield self.__build_request(url, depth, self.frontier.score(url, depth))
+            return
+        self.__complete_request(response.request)
+        self.crawler.stats.inc_value('guards/links_skipped_by_probe')
+        yield from self.__dispatch()
+
+    def errback(self, failure):
+        request = failure.request
+        if request.meta.get('frontier_probe'):
+            # Some servers do not support HEAD requests, download the link to find out what it is.
+            url, depth = request.meta['frontier_url'], request.meta['frontier_depth']
+            yield self.__build_request(url, depth, self.frontier.score(url, depth))
+            return
+        self.__complete_request(request)
+        logging.debug(f"Failed to crawl {request.url}: {failure.getErrorMessage()}")
+        yield from self.__dispatch()
+
+    def request_dropped(self, request, spider):
+        # The scheduler dropped the request, its slot in the budget is free again.
+        if spider is self:
+            self.__complete_request(request)
+
+    def page_stored(self, item, metadata_row: dict):
+        """
+        Called by the StoragePipeline once the page of @item is stored.
+        """
+        self.metadata_rows.append(metadata_row)
+        self.unstored_urls.pop(item['url'], None)
+        if self.page_history is not None:
+            self.page_history.record(item['url'], item['etag'], item['last_modified'], item['body_hash'],
+                                     item['hash'], item['links'])
+
+    def closed(self, reason):
+        self.__report_stats()
+        if self.checkpoint_loop is not None and self.checkpoint_loop.running:
+            self.checkpoint_loop.stop()
+        deferreds = []
+        if self.page_history is not None:
+            deferreds.append(threads.deferToThread(self.page_history.save))
+        if self.checkpoint_store is not None:
+            if reason in ('finished', 'page_budget_reached'):
+                deferreds.append(threads.deferToThread(self.checkpoint_store.discard, self.checkpoint_key))
+            else:
+                # The crawl was interrupted (e.g. shutdown), keep a checkpoint to resume it.
+                deferreds.append(self.__save_checkpoint())
+        if deferreds:
+            return defer.DeferredList(deferreds)
+
+    def __filter_links(self, response, hrefs: list) -> list:
+        links = []
+        for href in hrefs:
+            url = response.urljoin(href)
+            # Check if the domain is allowed (the same check as Scrapy's OffsiteMiddleware).
+            if is_url_in_domains(url, self.allowed_domains):
+                # Check if the filter is a prefix of the url.
+                if not self.filter or self.filter in url:
+                    links.append(url)
+        return links
+
+    def __load_state(self):
+        # Runs in a thread: loads the page history and the checkpoint of the website.
+        if self.page_history is not None:
+            self.page_history.load()
+        if self.checkpoint_store is not None:
+            return self.checkpoint_store.load(self.checkpoint_key)
+        return None
+
+    def __restore_checkpoint(self, state):
+        if state is not None:
+            self.seen_urls = UrlSeenSet.from_bytes(state['seen_urls'])
+            self.frontier.restore(state['frontier'])
+            self.metadata_rows = state['metadata_rows']
+            self.pages_completed = len(self.metadata_rows)
+            self.parse_seconds = state['parse_seconds']
+            self.resumed_requests = state['pending_urls']
+            for key, value in state['stats'].items():
+                self.crawler.stats.inc_value(key, value)
+            self.crawler.stats.set_value('checkpoint/resumed_pages', self.pages_completed)
+            logging.info(f'Resuming the crawl of {self.checkpoint_key} from its checkpoint: '
+                         f'{self.pages_completed} pages done, {len(self.resumed_requests)} pending, '
+                         f'{len(self.frontier)} in the frontier.')
+        if self.checkpoint_store is not None:
+            self.checkpoint_loop = task.LoopingCall(self.__save_checkpoint)
+            self.checkpoint_loop.start(self.checkpoint_interval, now=False)
+
+    def __save_checkpoint(self):
+        # The state is captured on the reactor thread so that it is consistent, and written in a thread.
+        # Only the stored pages count as done: the pages parsed but not stored yet go back to the frontier.
+        state = {
+            'seen_urls': self.seen_urls.to_bytes(),
+            'frontier': self.frontier.to_list(),
+            'metadata_rows': list(self.metadata_rows),
+            'parse_seconds': self.parse_seconds,
+            'pending_urls': {**self.unstored_urls, **self.pending_urls},
+            'stats': {key: value for key, value in self.crawler.stats.get_stats().items()
+                      if isinstance(value, (int, float)) and not isinstance(value, bool)
+                      and not key.startswith(('memusage/', 'checkpoint/'))}
+        }
+        deferred = threads.deferToThread(self.checkpoint_store.save, self.checkpoint_key, state)
+        deferred.addErrback(lambda failure: logging.error(
+            f'Failed to checkpoint the crawl of {self.checkpoint_key}: {failure.getErrorMessage()}'))
+        return deferred
+
+    def __complete_request(self, request):
+        self.pending_urls.pop(request.meta.get('frontier_url'), None)
+
+    def __add_to_frontier(self, url: str, depth: int) -> None:
+        """
+        Adds @url found at @depth to the frontier if it was not seen yet and is not too deep.
+        The URL is deduplicated on its canonical form but fetched as it is, since some servers need e.g. the
+        trailing slash.
+        """
+        if url in self.seen_urls:
+            self.crawler.stats.inc_value('dedup/duplicate_links')
+            return
+        if has_skipped_extension(url):
+            # Added to the seen-set so that it is only counted once.
+            self.seen_urls.add(url)
+            self.crawler.stats.inc_value('guards/links_skipped_by_extension')
+            return
+        if not self.frontier.push(url, depth):
+            self.crawler.stats.inc_value('frontier/links_too_deep')
+            return
+        self.seen_urls.add(url)
+
+    def __dispatch(self):
+        """
+        Yields the requests of the best links of the frontier, as long as there are fewer than
+        max_requests_in_flight requests in flight and the page budget allows it.
+        """
+        while len(self.frontier) > 0 and self.requests_in_flight < self.max_requests_in_flight:
+            if self.strict_page_budget and self.budget_left <= 0:
+                return
+            url, depth, score = self.frontier.pop()
+            self.pending_urls[url] = depth
+            self.crawler.stats.max_value('frontier/max_depth', depth)
+            if self.probe_unknown_types and has_unknown_extension(url):
+                self.crawler.stats.inc_value('guards/probe_requests')
+                yield scrapy.Request(url, method='HEAD', callback=self.parse_probe, errback=self.errback,
+                                     dont_filter=True, priority=-score,
+                                     meta={'frontier_url': url, 'frontier_depth': depth, 'frontier_probe': True})
+            else:
+                yield self.__build_request(url, depth, score)
+
+    def __build_request(self, url: str, depth: int, score: int) -> scrapy.Request:
+        # frontier_url identifies the request in the frontier, even after a redirect. Scrapy downloads the requests
+        # with the highest priority first.
+        meta = {'frontier_url': url, 'frontier_depth': depth}
+        if self.max_response_bytes is not None:
+            meta['max_response_bytes'] = self.max_response_bytes
+        headers = {}
+        if self.page_history is not None:
+            # Send a conditional request when the page was crawled before, and let the 304 responses through.
+            headers = self.page_history.conditional_headers(url)
+            meta['handle_httpstatus_list'] = [304]
+        return scrapy.Request(url, callback=self.parse, errback=self.errback, dont_filter=True, headers=headers,
+                              meta=meta, priority=-score)
+
+    def __is_redirect_to_seen_url(self, response) -> bool:
+        redirect_urls = response.request.meta.get('redirect_urls')
+        if not redirect_urls or canonicalize_url(redirect_urls[0]) == canonicalize_url(response.url):
+            return False
+        return not self.seen_urls.add(response.url)
+
+    def __report_stats(self):
+        """
+        Reports the CPU time spent parsing, the size of the seen-set and the links that were not scheduled because of
+        the page budget, along with an estimate of the bandwidth and the CPU time that would have been spent on them.
+        """
+        stats = self.crawler.stats
+        stats.set_value('parse/cpu_seconds', round(self.parse_seconds, 3))
+        stats.set_value('dedup/seen_urls', len(self.seen_urls))
+        stats.set_value('dedup/seen_set_bytes', self.seen_urls.size_in_bytes)
+        links_not_scheduled = len(self.frontier)
+        stats.set_value('budget/links_not_scheduled', links_not_scheduled)
+        num_responses = stats.get_value('response_received_count', 0)
+        if num_responses > 0:
+            bytes_per_response = stats.get_value('downloader/response_bytes', 0) / num_responses
+            stats.set_value('budget/estimated_bytes_saved', int(links_not_scheduled * bytes_per_response))
+        if self.pages_completed > 0:
+            cpu_seconds_per_page = self.parse_seconds / self.pages_completed
+            stats.set_value('budget/estimated_cpu_seconds_saved', round(links_not_scheduled * cpu_seconds_per_page, 3))
@@ -0,0 +1,76 @@
+import json
+import logging
+from typing import List, Optional
+
+from drivers.crawler.utils.url_canonicalizer import canonicalize_url
+from drivers.utilities.file import File
+
+HISTORY_FILE_NAME = 'page_history.jsonl'
+
+
+class PageHistory:
+    """
+    The history of the pages crawled on a website, stored next to the pages in @target_directory.
+
+    For every page it keeps the validators sent by the server (ETag, Last-Modified), the MD5 hash of the response
+    body and of the extracted text (see ParsedObject.hash) and the links followed from the page. The next crawl
+    sends conditional requests with the validators and skips the extraction and the upload of the pages that did
+    not change, while still following their links.
+    """
+
+    def __init__(self, target_directory: str, file: Optional[File] = None):
+        self.file = file if file else File()
+        self.file_path = f'{target_directory}/{HISTORY_FILE_NAME}'
+        self.entries = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self) -> None:
+        """
+        Loads the history written by the previous crawl, if any.
+        :return:
+        """
+        if not self.file.exists(self.file_path):
+            return
+        for line in self.file.read(self.file_path).splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                self.entries[canonicalize_url(entry['url'])] = entry
+        logging.info(f'Loaded the history of {len(self.entries)} pages from {self.file_path}')
+
+    def save(self) -> None:
+        """
+        Writes the history back to the storage.
+        :return:
+        """
+        contents = '\n'.join(json.dumps(entry) for entry in self.entries.values())
+        self.file.write(contents, self.file_path)
+
+    def get(self, url: str) -> Optional[dict]:
+        return self.entries.get(canonicalize_url(url))
+
+    def record(self, url: str, etag: Optional[str], last_modified: Optional[str], body_hash: str,
+               text_hash: str, links: List[str]) -> None:
+        self.entries[canonicalize_url(url)] = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'body_hash': body_hash,
+            'hash': text_hash,
+            'links': links
+        }
+
+    def conditional_headers(self, url: str) -> dict:
+        """
+        Returns the headers of a conditional request for @url, based on the validators of the previous crawl.
+        """
+        entry = self.get(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
@@ -0,0 +1,219 @@
+import gzip
+import io
+import json
+import logging
+import re
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+from drivers.utilities.file import File
+
+# The directory of the shards, under the directory of the website.
+SHARDS_DIRECTORY_NAME = 'shards'
+# The index of the pages stored in the shards, next to them. It is rewritten when a crawl ends, and each shard has an
+# index of its own pages, written along with it, so that the shards of an interrupted crawl stay indexed.
+SHARD_INDEX_FILE_NAME = 'index.jsonl'
+# The size of the compressed pages beyond which a shard is written and the next one started.
+MAX_SHARD_BYTES = 16 * 1024 * 1024
+# The gzip compression level of the pages, favoring speed.
+COMPRESSION_LEVEL = 6
+
+_SHARD_FILE_NAME_PATTERN = re.compile(r'^pages-(\d+)\.jsonl\.gz$')
+# The index of the pages of a shard, possibly compressed by File (see StorageConfig).
+_SHARD_INDEX_FILE_NAME_PATTERN = re.compile(r'^pages-(\d+)\.index\.jsonl(\.\w+)?$')
+
+
+def get_shard_file_name(shard_number: int) -> str:
+    return f'pages-{shard_number:05d}.jsonl.gz'
+
+
+def get_shard_index_file_name(shard_number: int) -> str:
+    return f'pages-{shard_number:05d}.index.jsonl'
+
+
+def get_shard_number(shard_file_name: str) -> int:
+    return int(_SHARD_FILE_NAME_PATTERN.match(shard_file_name).group(1))
+
+
+def read_shard_index(file: File, shards_directory: str) -> Tuple[dict, int]:
+    """
+    Reads the index of the shards of @shards_directory: the index written by the last crawl that ended, updated with
+    the indexes of the shards, e.g. those written by an interrupted crawl.
+    :return: The index entry ({"url", "file_name", "shard", "offset", "length"}) of every page, by URL, and the number
+    of the next shard, after all the shards listed in @shards_directory.
+    """
+    index = {}
+    next_shard_number = 0
+    shard_index_paths = []
+    for file_name in file.iter_files(shards_directory):
+        shard_match = _SHARD_FILE_NAME_PATTERN.match(file_name)
+        index_match = _SHARD_INDEX_FILE_NAME_PATTERN.match(file_name)
+        if shard_match:
+            next_shard_number = max(next_shard_number, int(shard_match.group(1)) + 1)
+        elif index_match:
+            next_shard_number = max(next_shard_number, int(index_match.group(1)) + 1)
+            shard_index_paths.append(f'{shards_directory}/{file_name}')
+    index_path = f'{shards_directory}/{SHARD_INDEX_FILE_NAME}'
+    for path in ([index_path] if file.exists(index_path) else []) + sorted(shard_index_paths):
+        for line in file.read(path).splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                previous_entry = index.get(entry['url'])
+                # A page written again is in a later shard.
+                if previous_entry is None or get_shard_number(entry['shard']) >= get_shard_number(
+                        previous_entry['shard']):
+                    index[entry['url']] = entry
+    return index, next_shard_number
+
+
+class PageShardWriter:
+    """
+    Writes the pages of a website into a few large shards instead of one object per page, so that storing a crawl
+    costs a request per shard instead of a request per page.
+
+    A shard is a JSONL file of the pages ({"url", "file_name", "text"}) where every line is compressed as its own gzip
+    member, like the records of a WARC.gz file: the shard is a valid .jsonl.gz file as a whole, and each page can be
+    decompressed alone. The index (SHARD_INDEX_FILE_NAME) gives the shard, offset and length of every page, so that
+    reading a page by URL costs a single ranged read (see PageShardReader).
+
+    The shards are append-only: the shards of the previous crawls are never rewritten, the pages written again go to
+    new shards and the index keeps pointing to the old shards for the others (e.g. the pages that did not change).
+    The index of the pages of a shard is written right after the shard, before its pages are returned as written, so
+    that the pages of an interrupted crawl are never reported as stored without being indexed.
+    The writer is thread-safe. The current shard is held in memory until its pages take @max_shard_bytes compressed.
+
+    @directory: The directory of the website. The shards and the index are written to its SHARDS_DIRECTORY_NAME
+    directory.
+    @file: The File used to write the shards.
+    @max_shard_bytes: The size of the compressed pages beyond which a shard is written.
+    """
+
+    def __init__(self, directory: str, file: Optional[File] = None, max_shard_bytes: int = MAX_SHARD_BYTES):
+        self.shards_directory = f'{directory}/{SHARDS_DIRECTORY_NAME}'
+        self.file = file if file else File()
+        self.max_shard_bytes = max_shard_bytes
+        self.lock = threading.Lock()
+        # The index entry of every page written, by URL.
+        self.index = {}
+        self.shard_number = 0
+        # The index entries (without the shard), the items and the bytes of the pages of the current shard.
+        self.shard_entries = []
+        self.shard_items = []
+        self.shard_buffer = io.BytesIO()
+        self.num_shards_written = 0
+        self.num_bytes_written = 0
+
+    def load_index(self) -> None:
+        """
+        Loads the index written by the previous crawls, if any, so that their pages stay indexed and the new shards
+        are numbered after all the existing shards, indexed or not. Call it before adding pages.
+        """
+        index, next_shard_number = read_shard_index(self.file, self.shards_directory)
+        with self.lock:
+            self.index.update(index)
+            self.shard_number = max(self.shard_number, next_shard_number)
+        if index:
+            logging.info(f'Loaded the index of {len(index)} pages from {self.shards_directory}')
+
+    def add(self, url: str, file_name: str, text: str, item=None) -> List:
+        """
+        Adds a page to the current shard, and writes the shard if it is full.
+        :param item: Returned once the page is written, e.g. its scraped item.
+        :return: The items of the pages written by this call, empty if the shard is not full yet.
+        """
+        record = gzip.compress(
+            (json.dumps({'url': url, 'file_name': file_name, 'text': text}) + '\n').encode('utf-8'),
+            compresslevel=COMPRESSION_LEVEL)
+        with self.lock:
+            self.shard_entries.append({'url': url, 'file_name': file_name, 'offset': self.shard_buffer.tell(),
+                                       'length': len(record)})
+            self.shard_buffer.write(record)
+            self.shard_items.append(item)
+            if self.shard_buffer.tell() < self.max_shard_bytes:
+                return []
+            shard = self.__next_shard()
+        # Upload outside the lock, so that the other threads keep adding pages to the next shard.
+        return self.__write_shard(*shard)
+
+    def close(self) -> List:
+        """
+        Writes the last shard and the index.
+        :return: The items of the pages of the last shard.
+        """
+        with self.lock:
+            shard = self.__next_shard()
+        items = self.__write_shard(*shard) if shard[1] else []
+        with self.lock:
+            index = ''.join(json.dumps(entry) + '\n' for entry in self.index.values())
+        self.file.write(index, f'{self.shards_directory}/{SHARD_INDEX_FILE_NAME}')
+        return items
+
+    def __next_shard(self) -> Tuple[str, list, list, bytes]:
+        # Returns the (file name, index entries, items, contents) of the current shard and starts the next one. Called
+        # with the lock held.
+        shard = (get_shard_file_name(self.shard_number), self.shard_entries, self.shard_items,
+                 self.shard_buffer.getvalue())
+        self.shard_number += 1
+        self.shard_entries = []
+        self.shard_items = []
+        self.shard_buffer = io.BytesIO()
+        return shard
+
+    def __write_shard(self, shard_file_name: str, entries: list, items: list, contents: bytes) -> List:
+        self.file.write(contents, f'{self.shards_directory}/{shard_file_name}')
+        # Only index the pages once their shard is stored.
+        entries = [{**entry, 'shard': shard_file_name} for entry in entries]
+        self.file.write(''.join(json.dumps(entry) + '\n' for entry in entries),
+                        f'{self.shards_directory}/{get_shard_index_file_name(get_shard_number(shard_file_name))}')
+        logging.info(f'Wrote {len(entries)} pages ({len(contents)} bytes) to {self.shards_directory}/{shard_file_name}')
+        with self.lock:
+            for entry in entries:
+                self.index[entry['url']] = entry
+            self.num_shards_written += 1
+            self.num_bytes_written += len(contents)
+        return items
+
+
+class PageShardReader:
+    """
+    Reads the pages written by a PageShardWriter.
+
+    @directory: The directory of the website.
+    @file: The File used to read the shards.
+    """
+
+    def __init__(self, directory: str, file: Optional[File] = None):
+        self.shards_directory = f'{directory}/{SHARDS_DIRECTORY_NAME}'
+        self.file = file if file else File()
+        self.index, _ = read_shard_index(self.file, self.shards_directory)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.index
+
+    def get(self, url: str) -> Optional[dict]:
+        """
+        Reads the page of @url with a single ranged read of its shard.
+        :return: The page ({"url", "file_name", "text"}), None if it is not in the shards.
+        """
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        record = self.file.read_bytes(f'{self.shards_directory}/{entry["shard"]}', entry['offset'], entry['length'])
+        return json.loads(gzip.decompress(record))
+
+    def iter_pages(self) -> Iterator[dict]:
+        """
+        Reads all the pages of the index, one shard at a time.
+        :return: An iterator over the pages ({"url", "file_name", "text"}), shard by shard.
+        """
+        entries_by_shard = {}
+        for entry in self.index.values():
+            entries_by_shard.setdefault(entry['shard'], []).append(entry)
+        for shard_file_name in sorted(entries_by_shard):
+            contents = self.file.read_bytes(f'{self.shards_directory}/{shard_file_name}')
+            # The pages written again in a later shard are not in the index, and are skipped.
+            for entry in sorted(entries_by_shard[shard_file_name], key=lambda entry: entry['offset']):
+                yield json.loads(gzip.decompress(contents[entry['offset']:entry['offset'] + entry['length']]))
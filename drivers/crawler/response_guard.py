@@ -0,0 +1,119 @@
+import logging
+import os
+import weakref
+from typing import Optional
+from urllib.parse import urlsplit
+
+from scrapy import signals
+from scrapy.exceptions import StopDownload
+from scrapy.linkextractors import IGNORED_EXTENSIONS
+
+# The content types of the pages DecoverSpider extracts the text from, any other response is aborted.
+HTML_CONTENT_TYPES = {'text/html', 'application/xhtml+xml'}
+# The extensions of the URLs that are expected to be web pages. The URLs without an extension are expected to be
+# web pages as well.
+HTML_EXTENSIONS = {'html', 'htm', 'xhtml', 'shtml', 'php', 'asp', 'aspx', 'jsp', 'jspx', 'cfm', 'cgi', 'pl', 'do',
+                   'action'}
+# The extensions of the URLs that are never crawled (images, archives, videos, documents...). The PDFs are
+# downloaded separately, see DecoverSpider.should_download_pdf.
+SKIPPED_EXTENSIONS = set(IGNORED_EXTENSIONS) | {'json', 'xml', 'csv', 'txt', 'js', 'woff', 'woff2', 'ttf', 'gz',
+                                                'webp', 'avif', 'mkv', 'epub', 'msi'}
+# The default maximum size of a response, see ResponseGuard.
+MAX_RESPONSE_BYTES = 10 * 1024 * 1024
+
+
+def get_url_extension(url: str) -> str:
+    """
+    Returns the lowercase extension of the path of @url without the dot, or '' if it has none.
+    """
+    return os.path.splitext(urlsplit(url).path)[1][1:].lower()
+
+
+def has_skipped_extension(url: str) -> bool:
+    return get_url_extension(url) in SKIPPED_EXTENSIONS
+
+
+def has_unknown_extension(url: str) -> bool:
+    """
+    Returns True if the extension of @url tells neither that it is a web page nor that it is not, e.g. /view.download.
+    """
+    extension = get_url_extension(url)
+    return extension != '' and extension not in HTML_EXTENSIONS and extension not in SKIPPED_EXTENSIONS
+
+
+def is_html_content_type(content_type: Optional[bytes]) -> bool:
+    """
+    Returns True if the Content-Type header @content_type is the one of a web page. A missing Content-Type is
+    considered a web page, Scrapy guesses the type of the response from its body then.
+    """
+    if not content_type:
+        return True
+    return content_type.split(b';')[0].strip().decode('latin-1').lower() in HTML_CONTENT_TYPES
+
+
+class ResponseGuard:
+    """
+    A Scrapy extension that aborts the downloads DecoverSpider has no use for, as soon as it knows it:
+    1. When the headers are received, the responses that are not web pages (see HTML_CONTENT_TYPES) and the
+    responses whose Content-Length is larger than the maximum size are aborted.
+    2. While the body is received, the responses that grow larger than the maximum size are aborted, e.g. very large
+    HTML dumps sent without a Content-Length.
+    Refer: https://docs.scrapy.org/en/2.9/topics/request-response.html#topics-stop-response-download
+
+    The maximum size is the GUARD_MAX_RESPONSE_BYTES setting (MAX_RESPONSE_BYTES by default) and can be set per
+    request with request.meta['max_response_bytes']. The aborted requests fail with StopDownload and the numbers
+    of aborted responses and of bytes saved are reported in the guards/* stats of the crawl. The bytes saved are
+    only known for the responses with a Content-Length, the responses aborted without one are counted in
+    guards/responses_aborted_without_length.
+    """
+
+    def __init__(self, crawler, max_response_bytes: int):
+        self.crawler = crawler
+        self.max_response_bytes = max_response_bytes
+        # The Content-Length (None if unknown) and the number of bytes received of each download in progress, by
+        # request. Not kept in request.meta, which is copied to the retries and the redirects of the request: each
+        # of them is a new download.
+        self.downloads = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler, crawler.settings.getint('GUARD_MAX_RESPONSE_BYTES', MAX_RESPONSE_BYTES))
+        crawler.signals.connect(extension.headers_received, signal=signals.headers_received)
+        crawler.signals.connect(extension.bytes_received, signal=signals.bytes_received)
+        return extension
+
+    def headers_received(self, headers, body_length, request, spider):
+        if request.method == 'HEAD':
+            return
+        if not is_html_content_type(headers.get('Content-Type')):
+            self.__abort(request, 'guards/responses_aborted_by_content_type', body_length,
+                         f'its content type is {headers.get("Content-Type")}')
+        if body_length > self.__get_max_response_bytes(request):
+            self.__abort(request, 'guards/responses_aborted_by_size', body_length,
+                         f'its size is {body_length} bytes')
+        # Scrapy reports a body length of -1 when there is no Content-Length.
+        self.downloads[request] = [body_length if body_length >= 0 else None, 0]
+
+    def bytes_received(self, data, request, spider):
+        download = self.downloads.setdefault(request, [None, 0])
+        download[1] += len(data)
+        body_length, received = download
+        if received > self.__get_max_response_bytes(request):
+            del self.downloads[request]
+            if body_length is None:
+                # The size of the rest of the body is unknown.
+                self.crawler.stats.inc_value('guards/responses_aborted_without_length')
+            self.__abort(request, 'guards/responses_aborted_by_size',
+                         body_length - received if body_length is not None else 0,
+                         f'it is larger than {self.__get_max_response_bytes(request)} bytes')
+
+    def __get_max_response_bytes(self, request) -> int:
+        return request.meta.get('max_response_bytes', self.max_response_bytes)
+
+    def __abort(self, request, stat: str, bytes_saved: int, reason: str):
+        stats = self.crawler.stats
+        stats.inc_value(stat)
+        if bytes_saved > 0:
+            stats.inc_value('guards/bytes_saved', bytes_saved)
+        logging.debug(f'Aborting the download of {request.url}: {reason}')
+        raise StopDownload(fail=True)
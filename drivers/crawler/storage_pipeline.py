@@ -0,0 +1,204 @@
+import logging
+import time
+from io import StringIO
+
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
+
+from drivers.crawler.page_shards import PageShardWriter
+from drivers.crawler.utils.helper_methods import extract_file_name_from_url, unify_csv_format
+from drivers.utilities.file import File
+
+METADATA_FILE_NAME = 'metadata.csv'
+# The number of threads writing the pages of a crawl.
+UPLOAD_WORKERS = 8
+# The number of pages waiting for an upload thread beyond which the crawl is paused.
+UPLOAD_QUEUE_SIZE = 32
+
+
+class StoragePipeline:
+    """
+    A pipeline that writes every scraped page to the storage backend as soon as it is scraped.
+    Refer: https://docs.scrapy.org/en/2.9/topics/item-pipeline.html
+
+    The writes run on a pool of @upload_workers threads of their own, and the pages beyond wait in the upload queue:
+    process_item() returns a Deferred that only fires once the page is stored, so Scrapy keeps the page in its scraper
+    slot until then. When @upload_queue_size pages are waiting, the crawl engine is paused, so that no new page is
+    scheduled, and it is resumed once the queue drains below @upload_queue_size. Only the downloads already in flight
+    can still add pages to the queue. This keeps the memory of a crawl bounded while the storage I/O overlaps with the
+    crawl, and slows the crawl down when the storage falls behind.
+    The depth of the upload queue, the pauses and the time spent writing are recorded in the storage/* stats.
+
+    The pages whose text did not change since the previous crawl (item['unchanged']) are not written again but are
+    still listed in the metadata file.
+
+    With @packed_output, the pages are packed into a few compressed shards with an index instead of one file per page
+    (see PageShardWriter). A page only counts as stored once its shard and the index of the shard are written, so that
+    an interrupted crawl crawls again the pages of the shard it did not write.
+
+    The spider must define:
+    @target_directory: The directory where the pages and the metadata file are written.
+    @page_metadata: The columns added to the metadata row of every page (title, jurisdiction, category).
+    @metadata_rows: The metadata rows of the pages stored, kept by the spider so that they are checkpointed with
+    the crawl.
+    @page_stored(item, metadata_row): Called on the reactor thread once the page of an item is stored.
+    """
+
+    def __init__(self, upload_workers: int = UPLOAD_WORKERS, upload_queue_size: int = UPLOAD_QUEUE_SIZE,
+                 packed_output: bool = False):
+        self.file = None
+        self.upload_workers = upload_workers
+        self.upload_queue_size = upload_queue_size
+        self.packed_output = packed_output
+        self.shard_writer = None
+        self.upload_pool = None
+        # The pages being written. The pages waiting for an upload thread are in upload_slots.waiting.
+        self.upload_slots = defer.DeferredSemaphore(upload_workers)
+        # Whether the crawl is paused until the upload queue drains.
+        self.paused = False
+        self.opened_at = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.getint('STORAGE_UPLOAD_WORKERS', UPLOAD_WORKERS),
+                   crawler.settings.getint('STORAGE_UPLOAD_QUEUE_SIZE', UPLOAD_QUEUE_SIZE),
+                   crawler.settings.getbool('STORAGE_PACKED_OUTPUT', False))
+
+    def open_spider(self, spider):
+        self.file = File()
+        self.upload_pool = ThreadPool(minthreads=0, maxthreads=self.upload_workers, name='StoragePipeline')
+        self.upload_pool.start()
+        self.opened_at = time.monotonic()
+        if self.packed_output:
+            self.shard_writer = PageShardWriter(spider.target_directory, self.file)
+            # Keep the pages of the previous crawls in the index.
+            return threads.deferToThreadPool(reactor, self.upload_pool, self.shard_writer.load_index)
+
+    def close_spider(self, spider):
+        self.__resume_crawl(spider)
+        if self.packed_output:
+            # Write the last shard, then the metadata of its pages along with the others.
+            deferred = threads.deferToThreadPool(reactor, self.upload_pool, self.__write_shard_pages, spider,
+                                                 self.shard_writer.close)
+            deferred.addCallback(self.__on_shard_written, spider)
+            deferred.addCallback(lambda _: threads.deferToThreadPool(reactor, self.upload_pool, self.__write_metadata,
+                                                                     spider))
+        else:
+            deferred = threads.deferToThreadPool(reactor, self.upload_pool, self.__write_metadata, spider)
+        deferred.addBoth(self.__stop_upload_pool, spider)
+        return deferred
+
+    def process_item(self, item, spider):
+        stats = spider.crawler.stats
+        if self.upload_slots.tokens == 0:
+            stats.inc_value('storage/pages_waited_for_upload')
+        if self.packed_output and not item['unchanged']:
+            file_name = extract_file_name_from_url(item['url'])
+            deferred = self.upload_slots.run(threads.deferToThreadPool, reactor, self.upload_pool,
+                                             self.__write_shard_pages, spider, self.shard_writer.add, item['url'],
+                                             file_name, item['text'], item)
+            # The page is stored later, with its shard.
+            deferred.addCallback(self.__on_shard_written, spider)
+            deferred.addCallback(lambda _: item)
+        else:
+            deferred = self.upload_slots.run(threads.deferToThreadPool, reactor, self.upload_pool, self.__write_page,
+                                             item, spider)
+            deferred.addCallback(self.__on_page_written, item, spider)
+        # The pages waiting for an upload thread, including this one if it did not get one.
+        stats.max_value('storage/upload_queue_max_depth', len(self.upload_slots.waiting))
+        self.__apply_backpressure(spider)
+        deferred.addBoth(self.__on_upload_done, spider)
+        return deferred
+
+    def __on_upload_done(self, result, spider):
+        self.__apply_backpressure(spider)
+        return result
+
+    def __apply_backpressure(self, spider):
+        # Pauses the crawl while upload_queue_size pages wait for an upload thread.
+        if not self.paused and len(self.upload_slots.waiting) >= self.upload_queue_size:
+            self.paused = True
+            spider.crawler.engine.pause()
+            spider.crawler.stats.inc_value('storage/crawl_paused_for_upload')
+            logging.info(f'Paused the crawl of {spider.target_directory}: {len(self.upload_slots.waiting)} pages are '
+                         f'waiting for an upload')
+        elif self.paused and len(self.upload_slots.waiting) < self.upload_queue_size:
+            self.__resume_crawl(spider)
+
+    def __resume_crawl(self, spider):
+        if self.paused:
+            self.paused = False
+            spider.crawler.engine.unpause()
+
+    def __write_page(self, item, spider):
+        file_name = extract_file_name_from_url(item['url'])
+        start = time.monotonic()
+        if not item['unchanged']:
+            self.file.write(item['text'], f'{spider.target_directory}/{file_name}')
+        return file_name, time.monotonic() - start
+
+    @staticmethod
+    def __write_shard_pages(spider, write, *args):
+        # Adds a page to the shards, or writes the last shard, and returns the items of the pages written.
+        start = time.monotonic()
+        items = write(*args)
+        return items, time.monotonic() - start
+
+    def __on_shard_written(self, result, spider):
+        items, upload_seconds = result
+        stats = spider.crawler.stats
+        if items:
+            stats.inc_value('storage/upload_seconds', upload_seconds)
+        stats.set_value('storage/shards_written', self.shard_writer.num_shards_written)
+        stats.set_value('storage/shard_bytes_written', self.shard_writer.num_bytes_written)
+        for item in items:
+            self.__on_page_written((extract_file_name_from_url(item['url']), 0.0), item, spider)
+        return result
+
+    @staticmethod
+    def __on_page_written(result, item, spider):
+        file_name, upload_seconds = result
+        if item['unchanged']:
+            spider.crawler.stats.inc_value('storage/pages_unchanged')
+        else:
+            spider.crawler.stats.inc_value('storage/pages_written')
+            spider.crawler.stats.inc_value('storage/characters_written', len(item['text']))
+            spider.crawler.stats.inc_value('storage/upload_seconds', upload_seconds)
+        spider.page_stored(item, {
+            **spider.page_metadata,
+            "url": item['url'],
+            "file_name": file_name
+        })
+        return item
+
+    def __stop_upload_pool(self, result, spider):
+        self.upload_pool.stop()
+        stats = spider.crawler.stats
+        compression_stats = self.file.compression_stats.get_stats()
+        if compression_stats['files_compressed']:
+            stats.set_value('storage/compression_raw_bytes', compression_stats['raw_bytes'])
+            stats.set_value('storage/compression_compressed_bytes', compression_stats['compressed_bytes'])
+            stats.set_value('storage/compression_seconds', compression_stats['compression_seconds'])
+        elapsed_seconds = time.monotonic() - self.opened_at
+        pages_written = stats.get_value('storage/pages_written', 0)
+        logging.info(f'Wrote {pages_written} pages ({stats.get_value("storage/characters_written", 0)} characters) to '
+                     f'{spider.target_directory} in {elapsed_seconds:.1f}s: '
+                     f'{pages_written / elapsed_seconds if elapsed_seconds else 0:.2f} pages/s, '
+                     f'{stats.get_value("storage/upload_seconds", 0):.1f}s of uploads, max upload queue depth '
+                     f'{stats.get_value("storage/upload_queue_max_depth", 0)}, '
+                     f'{stats.get_value("storage/pages_waited_for_upload", 0)} pages waited for an upload slot, '
+                     f'the crawl was paused {stats.get_value("storage/crawl_paused_for_upload", 0)} times.'
+                     + (f' Packed the pages into {stats.get_value("storage/shards_written", 0)} shards '
+                        f'({stats.get_value("storage/shard_bytes_written", 0)} bytes).' if self.packed_output else '')
+                     + (f' Compressed {compression_stats["raw_bytes"]} bytes to {compression_stats["compressed_bytes"]} '
+                        f'(ratio {compression_stats["ratio"]}) in {compression_stats["compression_seconds"]}s.'
+                        if compression_stats['files_compressed'] else ''))
+        return result
+
+    def __write_metadata(self, spider):
+        # Write the csv file with the metadata of the pages written by this crawl.
+        metadata = StringIO()
+        unify_csv_format(metadata, spider.metadata_rows)
+        target_file_path = f'{spider.target_directory}/{METADATA_FILE_NAME}'
+        logging.info(f'Uploading metadata file to {target_file_path}')
+        self.file.write(metadata.getvalue(), target_file_path)
@@ -10,6 +10,8 @@ from tldextract import extract
 from typing import List, Dict, TextIO
 import csv
 
+from drivers.crawler.utils.url_canonicalizer import canonicalize_url
+
 download_dir = "/Users/ravidecover/Desktop/decoverlaws/usa/laws"
 
 
@@ -21,15 +23,16 @@ def get_text_from_html(html_content):
         script.extract()  # rip it out
 
     # get text
-    text = soup.get_text()
+    return normalize_whitespace(soup.get_text())
+
 
+def normalize_whitespace(text: str) -> str:
     # break into lines and remove leading and trailing space on each
     lines = (line.strip() for line in text.splitlines())
     # break multi-headlines into a line each
     chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
     # drop blank lines
-    text = ' '.join(chunk for chunk in chunks if chunk)
-    return text
+    return ' '.join(chunk for chunk in chunks if chunk)
 
 
 def get_pdf_links(html_content, filter):
@@ -91,24 +94,13 @@ def normalize_string(input_string: str) -> str:
     return re.sub(r'(\b\w)-(\w\b)', r'\1\2', normalized_string)
 
 
-# Take the last part of the URL and guess the closest file name.
-# Keep it normalized, subject to the following rules:
-# 1. Remove punctuation
-# 2. Convert to lowercase
-# 3. Capitalize the first letter of each word
-# 4. Remove multiple spaces
-# 5. Retain hyphens between consecutive words
 def extract_file_name_from_url(url: str) -> str:
-    # Remove the protocol and domain name from the URL.
-    url = url.replace('https://', '').replace('http://', '')
-    # Remove the trailing slash.
-    url = url.rstrip('/')
-    # Split the URL by slashes.
-    url_parts = url.split('/')
-    # Take the last part of the URL.
-    file_name = url_parts[-1]
-    # Take MD5 hash of the URL
-    return hashlib.md5(file_name.encode()).hexdigest() + '.txt'
+    """
+    Returns the name of the file where the contents of the page at @url are stored.
+    The name is the MD5 hash of the canonical URL, so two different pages never share a file name while the
+    variants of the same URL (fragment, query parameter order, trailing slash, etc.) do.
+    """
+    return hashlib.md5(canonicalize_url(url).encode()).hexdigest() + '.txt'
 
 
 def extract_domain(url):
@@ -119,6 +111,12 @@ def extract_domain(url):
     return parsed_url.path.split('/')[0]
 
 
+def is_url_in_domains(url: str, domains: List[str]) -> bool:
+    # Same rule as Scrapy's OffsiteMiddleware: the host is one of the domains or one of their subdomains.
+    host = (urlparse(url).hostname or '').lower()
+    return any(host == domain.lower() or host.endswith('.' + domain.lower()) for domain in domains)
+
+
 def unify_csv_format(file: TextIO, data_to_write: List[Dict[str, str]]):
     header_row = ['law_name', 'jurisdiction', 'category',
                   'sub_category', 'title', 'url', 'file_name']
@@ -0,0 +1,74 @@
+from typing import List, Optional
+
+from drivers.crawler.utils.helper_methods import normalize_whitespace
+
+# The elements whose contents are not part of the text of a page: get_text_from_html removes the scripts and the
+# styles, and BeautifulSoup's get_text() leaves out the strings of the templates and of the ruby annotations.
+SKIPPED_TAGS = {'script', 'style', 'template', 'rt', 'rp'}
+
+
+class ExtractedPage:
+    """
+    The text and the links extracted from a single parse of a web page.
+    """
+
+    def __init__(self, text: str = '', links: Optional[List[str]] = None, pdf_links: Optional[List[str]] = None):
+        self.text = text
+        self.links = links if links else []
+        self.pdf_links = pdf_links if pdf_links else []
+
+
+def extract_page(root, pdf_filter: Optional[str] = None) -> ExtractedPage:
+    """
+    Extracts the text, the links and the PDF links of a page from its lxml tree, e.g. the one Scrapy already built
+    for the response (response.selector.root), so the HTML is parsed only once.
+    The text is the same as get_text_from_html(<serialized body>) and the PDF links are the same as
+    get_pdf_links(<serialized body>, pdf_filter).
+    :param root: The root element of the page.
+    :param pdf_filter: Only the PDF links containing this string are returned.
+    :return: The ExtractedPage.
+    """
+    links = [str(href) for href in root.xpath('//a/@href')]
+    bodies = root.xpath('//body')
+    if not bodies:
+        return ExtractedPage(links=links)
+    body = bodies[0]
+    return ExtractedPage(text=normalize_whitespace(''.join(iter_text(body))),
+                         links=links,
+                         pdf_links=_get_pdf_links(body, pdf_filter))
+
+
+def iter_text(element):
+    """
+    Yields the strings of the text of @element in document order, without the contents of the SKIPPED_TAGS, of
+    the comments and of the processing instructions (like BeautifulSoup's get_text()). The tail of @element itself
+    is not part of its text.
+    """
+    if element.text:
+        yield element.text
+    # The tree is walked with an explicit stack since pages can be nested deeper than the recursion limit.
+    stack = [(iter(element), None)]
+    while stack:
+        children, parent = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if parent is not None and parent.tail:
+                yield parent.tail
+            continue
+        # Comments and processing instructions have a non-string tag.
+        if isinstance(child.tag, str) and child.tag not in SKIPPED_TAGS:
+            if child.text:
+                yield child.text
+            stack.append((iter(child), child))
+        elif child.tail:
+            yield child.tail
+
+
+def _get_pdf_links(body, pdf_filter: Optional[str]) -> List[str]:
+    # Find all <a> tags that have an 'href' attribute ending with '.pdf', ignoring the query string.
+    pdf_links = [str(href) for href in body.xpath('.//a/@href') if href and href.split('?')[0].endswith('.pdf')]
+    # Ensure that @pdf_filter is a substring of the link.
+    if pdf_filter is not None and pdf_filter != "":
+        pdf_links = [pdf_link for pdf_link in pdf_links if pdf_filter in pdf_link]
+    return pdf_links
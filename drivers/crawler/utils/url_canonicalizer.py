@@ -0,0 +1,139 @@
+import hashlib
+import re
+from array import array
+from urllib.parse import urlsplit, urlunsplit
+
+from w3lib.url import canonicalize_url as w3lib_canonicalize_url
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that identify a session or a campaign rather than a page.
+IGNORED_QUERY_PARAMETERS = {'jsessionid', 'phpsessid', 'aspsessionid', 'sid', 'sessionid', 'session_id', 'cfid',
+                            'cftoken', 'fbclid', 'gclid', 'msclkid'}
+IGNORED_QUERY_PARAMETER_PREFIXES = ('utm_',)
+
+# Session ids that some servers put in the path, e.g. /page;jsessionid=1234
+PATH_SESSION_ID_PATTERN = re.compile(r';(jsessionid|phpsessid|sid)=[^/?]*', re.IGNORECASE)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Returns the canonical form of @url, so that URLs pointing to the same page compare equal:
+    1. The scheme and the host are lowercased, the default port and the credentials are removed.
+    2. The fragment and the session/tracking parameters are removed.
+    3. The query parameters are sorted and the percent-encoding is normalized.
+    4. Duplicate slashes and the trailing slash of the path are removed.
+    :param url: An absolute URL.
+    :return: The canonical URL.
+    """
+    try:
+        parts = urlsplit(w3lib_canonicalize_url(url, keep_fragments=False))
+        port = parts.port
+    except ValueError:
+        # Not a URL we can make sense of (e.g. an invalid port), keep it as it is.
+        return url
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if port is not None and DEFAULT_PORTS.get(scheme) != port:
+        netloc = f'{netloc}:{port}'
+    path = PATH_SESSION_ID_PATTERN.sub('', parts.path)
+    path = re.sub(r'/{2,}', '/', path).rstrip('/') or '/'
+    query = '&'.join(parameter for parameter in parts.query.split('&')
+                     if parameter and not _is_ignored_query_parameter(parameter.split('=', 1)[0]))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def _is_ignored_query_parameter(name: str) -> bool:
+    name = name.lower()
+    return name in IGNORED_QUERY_PARAMETERS or name.startswith(IGNORED_QUERY_PARAMETER_PREFIXES)
+
+
+def url_fingerprint(url: str) -> int:
+    """
+    Returns a 64-bit fingerprint of the canonical form of @url.
+    """
+    digest = hashlib.blake2b(canonicalize_url(url).encode('utf-8'), digest_size=8).digest()
+    # 0 marks the empty slots of UrlSeenSet.
+    return int.from_bytes(digest, 'little') or 1
+
+
+class UrlSeenSet:
+    """
+    A memory-compact set of URLs.
+
+    Only the 64-bit fingerprint of the canonical form of each URL is kept, in an open-addressing hash table backed
+    by a flat array of unsigned 64-bit integers. The table is at most half full, so each URL costs between 16 and 32
+    bytes, i.e. a few MB for a domain with 100k+ URLs. Two different URLs collide with a probability of about
+    n^2 / 2^65, which is negligible for the size of a website.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        size = 1
+        while size < 2 * capacity:
+            size *= 2
+        self._slots = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, url: str) -> bool:
+        return self.contains_fingerprint(url_fingerprint(url))
+
+    @property
+    def size_in_bytes(self) -> int:
+        return self._slots.itemsize * len(self._slots)
+
+    def add(self, url: str) -> bool:
+        """
+        Adds @url to the set.
+        :return: True if the URL was not in the set yet, False otherwise.
+        """
+        return self.add_fingerprint(url_fingerprint(url))
+
+    def contains_fingerprint(self, fingerprint: int) -> bool:
+        slots, mask = self._slots, self._mask
+        index = fingerprint & mask
+        while slots[index] != 0:
+            if slots[index] == fingerprint:
+                return True
+            index = (index + 1) & mask
+        return False
+
+    def add_fingerprint(self, fingerprint: int) -> bool:
+        slots, mask = self._slots, self._mask
+        index = fingerprint & mask
+        while slots[index] != 0:
+            if slots[index] == fingerprint:
+                return False
+            index = (index + 1) & mask
+        slots[index] = fingerprint
+        self._count += 1
+        if 2 * self._count > len(slots):
+            self.__grow()
+        return True
+
+    def fingerprints(self):
+        return (fingerprint for fingerprint in self._slots if fingerprint != 0)
+
+    def to_bytes(self) -> bytes:
+        return self._slots.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'UrlSeenSet':
+        seen_set = cls(capacity=1)
+        seen_set._slots = array('Q')
+        seen_set._slots.frombytes(data)
+        seen_set._mask = len(seen_set._slots) - 1
+        seen_set._count = sum(1 for fingerprint in seen_set._slots if fingerprint != 0)
+        return seen_set
+
+    def __grow(self):
+        old_slots = self._slots
+        self._slots = array('Q', bytes(16 * len(old_slots)))
+        self._mask = len(self._slots) - 1
+        self._count = 0
+        for fingerprint in old_slots:
+            if fingerprint != 0:
+                self.add_fingerprint(fingerprint)
@@ -1,14 +1,12 @@
-import json
-import os
-import random
-import string
+from concurrent.futures import Future
 from logging.config import dictConfig
-from multiprocessing import Process, Queue
-
-import scrapy.crawler as crawler
-from twisted.internet import reactor
+from typing import List, Optional
 
+from drivers.common.crawl_result import CrawlResult
+from drivers.crawler.crawl_worker_pool import CrawlWorkerPool
 from drivers.crawler.decover_spider import DecoverSpider
+from drivers.crawler.response_guard import MAX_RESPONSE_BYTES
+from drivers.crawler.storage_pipeline import UPLOAD_QUEUE_SIZE, UPLOAD_WORKERS
 
 dictConfig({
     'version': 1,
@@ -26,100 +24,130 @@ dictConfig({
     }
 })
 
-
-def f(q, start_urls, allowed_domains, should_recurse, max_links, download_pdfs, file_name, filter):
-    """
-
-    :param file_name:
-    :param download_pdfs:
-    :param max_links:
-    :param q:
-    :param start_urls:
-    :param allowed_domains:
-    :param should_recurse:
-    :return:
-    """
-    try:
-        runner = crawler.CrawlerRunner(
-            settings={
-                'ITEM_PIPELINES': {
-                    'drivers.crawler.json_writer_pipeline.JsonWriterPipeline': 1,
-                },
-                'LOG_LEVEL': 'INFO',
-                'USER_AGENT': 'Mozilla/5.0 (iPad; CPU OS 12_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
-                              'Mobile/15E148',
-                'REFERRER_POLICY': 'origin'
-            }
-        )
-        deferred = runner.crawl(DecoverSpider,
-                                start_urls=start_urls,
-                                allowed_domains=allowed_domains,
-                                should_recurse=should_recurse,
-                                max_links=max_links,
-                                download_pdfs=download_pdfs,
-                                file_name=file_name,
-                                filter=filter)
-        deferred.addBoth(lambda _: reactor.stop())
-        reactor.run(0)
-        q.put(None)
-    except Exception as e:
-        q.put(e)
-
-
-def get_random_file_name(prefix='items', suffix='jsonl', length=10):
-    """
-    This method is used to generate a random file name.
-    :param length:
-    :param prefix:
-    :param suffix:
-    :return:
-    """
-    random_number = random.randint(1, 100000)
-    random_string = ''.join(random.choice(
-        string.ascii_letters + string.digits) for _ in range(length))
-    file_name = f'{prefix}_{random_number}_{random_string}.{suffix}'
-    return file_name
+# The Scrapy settings shared by every crawl.
+CRAWLER_SETTINGS = {
+    'ITEM_PIPELINES': {
+        'drivers.crawler.storage_pipeline.StoragePipeline': 1,
+    },
+    # Aborts the downloads of the responses that are not web pages or are larger than GUARD_MAX_RESPONSE_BYTES.
+    'EXTENSIONS': {
+        'drivers.crawler.response_guard.ResponseGuard': 0,
+    },
+    'GUARD_MAX_RESPONSE_BYTES': MAX_RESPONSE_BYTES,
+    # DecoverSpider deduplicates the requests on their canonical URL with a compact seen-set.
+    'DUPEFILTER_CLASS': 'scrapy.dupefilters.BaseDupeFilter',
+    # The StoragePipeline writes the pages with STORAGE_UPLOAD_WORKERS threads, and pauses the crawl while
+    # STORAGE_UPLOAD_QUEUE_SIZE pages wait for one.
+    'STORAGE_UPLOAD_WORKERS': UPLOAD_WORKERS,
+    'STORAGE_UPLOAD_QUEUE_SIZE': UPLOAD_QUEUE_SIZE,
+    # Whether the StoragePipeline packs the pages into a few compressed shards instead of one file per page.
+    'STORAGE_PACKED_OUTPUT': False,
+    # Number of threads used by Scrapy (e.g. for the DNS resolution) and by the spiders to load their state.
+    'REACTOR_THREADPOOL_MAXSIZE': 20,
+    'LOG_LEVEL': 'INFO',
+    'USER_AGENT': 'Mozilla/5.0 (iPad; CPU OS 12_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+                  'Mobile/15E148',
+    'REFERRER_POLICY': 'origin'
+}
 
 
 class WebSiteCrawlerScrapy:
     """
-    This class is used to crawl a website using Scrapy.
+    This class is used to crawl websites using Scrapy.
+    The crawls are dispatched to a pool of long-lived crawl workers, so that the cost of starting a process and a
+    Twisted reactor is only paid once per worker instead of once per website.
+
+    @num_workers: The number of crawl worker processes.
+    @crawls_per_worker: The number of websites each worker crawls at the same time.
+    @packed_output: Whether to pack the pages of a website into a few compressed shards with an index instead of
+    writing one file per page (see PageShardWriter).
     """
 
-    def __init__(self):
-        pass
-
-    # The wrapper to make it run more times.
-    def crawl(self, start_urls, allowed_domains, should_recurse, max_links, download_pdfs, filter) -> dict:
-        # Preprocess the inputs. start_urls should begin with https
+    def __init__(self, num_workers: int = 1, crawls_per_worker: int = 1, packed_output: bool = False):
+        self.pool = CrawlWorkerPool(dict(CRAWLER_SETTINGS, STORAGE_PACKED_OUTPUT=packed_output),
+                                    num_workers=num_workers, crawls_per_worker=crawls_per_worker)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self) -> None:
+        """
+        Starts the crawl workers.
+        :return:
+        """
+        self.pool.start()
+
+    def close(self) -> None:
+        """
+        Waits for the pending crawls and stops the crawl workers.
+        :return:
+        """
+        self.pool.shutdown()
+
+    def submit(self, start_urls, allowed_domains, should_recurse, max_links, download_pdfs, filter,
+               target_directory: str, page_metadata: Optional[dict] = None, incremental: bool = False,
+               checkpoint_dir: Optional[str] = None, max_depth: int = -1, priority_patterns: Optional[List[str]] = None,
+               low_priority_patterns: Optional[List[str]] = None) -> Future:
+        """
+        Dispatches the crawl of a website to the crawl workers.
+        The pages are written to @target_directory while the website is crawled, along with a metadata file.
+        :param page_metadata: The columns added to the metadata row of every page (title, jurisdiction, category).
+        :param incremental: Whether to skip the pages that did not change since the previous crawl.
+        :param checkpoint_dir: The local directory where the crawl is checkpointed, so that an interrupted crawl
+        resumes where it stopped. None disables the checkpoints.
+        :param max_depth: The maximum depth of the pages crawled from the start URLs, -1 for no limit.
+        :param priority_patterns: The regular expressions of the links crawled first, among the links containing
+        @filter.
+        :param low_priority_patterns: The regular expressions of the links crawled last.
+        :return: A Future that resolves to the CrawlResult of the website.
+        """
+        # Preprocess the inputs. start_urls without a scheme should begin with https
         for i in range(len(start_urls)):
-            if not start_urls[i].startswith('https'):
+            if not start_urls[i].startswith('http://') and not start_urls[i].startswith('https://'):
                 start_urls[i] = 'https://' + start_urls[i]
-        feed_export_file_name = get_random_file_name()
-        q = Queue()
-        p = Process(target=f, args=(q, start_urls,
-                                    allowed_domains, should_recurse, max_links, download_pdfs, feed_export_file_name, filter))
-        p.start()
-        result = q.get()
-        p.join()
-
-        # Read the results from the JSON file.
-        results = {}
+        if not self.pool.is_running:
+            self.start()
+        crawl_future = self.pool.submit(DecoverSpider,
+                                        start_urls=start_urls,
+                                        allowed_domains=allowed_domains,
+                                        should_recurse=should_recurse,
+                                        max_links=max_links,
+                                        download_pdfs=download_pdfs,
+                                        target_directory=target_directory,
+                                        page_metadata=page_metadata,
+                                        filter=filter,
+                                        incremental=incremental,
+                                        checkpoint_dir=checkpoint_dir,
+                                        max_depth=max_depth,
+                                        priority_patterns=priority_patterns,
+                                        low_priority_patterns=low_priority_patterns)
+        site_name = page_metadata.get('title') if page_metadata else None
+        result_future = Future()
+        result_future.set_running_or_notify_cancel()
+        crawl_future.add_done_callback(
+            lambda future: self.__to_crawl_result(future, site_name, result_future))
+        return result_future
 
-        # Step III: Go through and read the results from the JSON file.
-        with open(feed_export_file_name, 'r') as file:
-            for line in file:
-                item = json.loads(line)
-                for url, content in item.items():
-                    results[url] = content
-
-        # Step IV: Clean up (Delete the JSON file).
-        if os.path.exists(feed_export_file_name):
-            os.remove(feed_export_file_name)
-
-        if result is not None:
-            raise result
-        return results
+    # The wrapper to make it run more times.
+    def crawl(self, start_urls, allowed_domains, should_recurse, max_links, download_pdfs, filter,
+              target_directory: str, page_metadata: Optional[dict] = None, incremental: bool = False,
+              checkpoint_dir: Optional[str] = None, max_depth: int = -1, priority_patterns: Optional[List[str]] = None,
+              low_priority_patterns: Optional[List[str]] = None) -> CrawlResult:
+        return self.submit(start_urls, allowed_domains, should_recurse, max_links, download_pdfs, filter,
+                           target_directory, page_metadata, incremental, checkpoint_dir, max_depth,
+                           priority_patterns, low_priority_patterns).result()
+
+    @staticmethod
+    def __to_crawl_result(crawl_future: Future, site_name: Optional[str], result_future: Future):
+        error = crawl_future.exception()
+        if error is not None:
+            result_future.set_exception(error)
+        else:
+            result_future.set_result(CrawlResult(site_name=site_name, stats=crawl_future.result()))
 
 
 if __name__ == "__main__":
@@ -127,7 +155,7 @@ if __name__ == "__main__":
     site = "https://law.justia.com/cases/federal/appellate-courts/ca7/"
     domain = "law.justia.com"
     filter = "federal/appellate-courts/ca7"
-    crawler = WebSiteCrawlerScrapy()
-    results = crawler.crawl([site], [domain], True, 25, False, filter)
-    # Print the set of urls that were crawled.
-    print(results.keys())
+    with WebSiteCrawlerScrapy() as crawler:
+        result = crawler.crawl([site], [domain], True, 25, False, filter, 'output/usa/case/lawjustia-com')
+    # Print the number of pages that were crawled.
+    print(result.num_pages)
@@ -2,24 +2,49 @@ import csv
 import os
 import re
 import logging
-import requests
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 from drivers.common.law_elem import LawElem
 from drivers.crawler.utils.helper_methods import get_target_file_path, unify_csv_format, normalize_string
 from drivers.utilities.bing_client import BingClient
+from drivers.utilities.existence_index import ExistenceIndex
 from drivers.utilities.file import File
+from drivers.utilities.http_downloader import HttpDownloader
+from drivers.utilities.rate_limiter import TokenBucket
+from drivers.utilities.search_cache import SearchCache
 
 METADATA_FILE_NAME = 'metadata.csv'
 
 
 class BingDriver:
-    def __init__(self, csv_path: str, base_dir: str, max_laws: int):
+    """
+    Searches the laws of the CSV file on Bing and downloads their PDFs.
+
+    @download_parallelism: The maximum number of PDFs downloaded at the same time.
+    @downloads_per_host: The maximum number of PDFs downloaded at the same time from the same host.
+    @search_parallelism: The maximum number of Bing searches in flight at the same time.
+    @search_qps: The queries per second allowed by the Bing tier, None for no limit.
+    @search_cache_path: The path of the persistent cache of the Bing search results, None to disable it.
+    @search_cache_ttl_seconds: The time to live of the cached search results.
+    """
+
+    def __init__(self, csv_path: str, base_dir: str, max_laws: int, download_parallelism: int = 16,
+                 downloads_per_host: int = 4, search_parallelism: int = 8, search_qps: Optional[float] = None,
+                 search_cache_path: Optional[str] = None, search_cache_ttl_seconds: float = 30 * 24 * 3600):
         self.csv_path = csv_path
-        self.bing_client = BingClient()
+        self.search_parallelism = search_parallelism
+        self.search_cache_path = search_cache_path
+        self.search_cache_ttl_seconds = search_cache_ttl_seconds
+        self.bing_client = BingClient(rate_limiter=TokenBucket(search_qps) if search_qps else None,
+                                      max_connections=search_parallelism)
         self.target_base_dir = base_dir
         self.max_laws = max_laws
         self.file = File()
+        # Whether the PDFs of the laws already exist is checked with one listing per jurisdiction and category.
+        self.file.existence_index = ExistenceIndex(self.file.s3_client)
+        self.download_parallelism = download_parallelism
+        self.downloads_per_host = downloads_per_host
 
     def ping(self) -> str:
         logging.info('Pinging BingDriver...')
@@ -32,8 +57,10 @@ class BingDriver:
         self.__validate_csv_path()
         laws = self.__read_laws_from_csv()
         output_laws = self.__search_laws(laws)
+        logging.info(f'S3 existence index: {self.file.existence_index.get_stats()}')
         num_laws_downloaded = self.__download_laws(output_laws)
         self.__write_metadata(output_laws)
+        logging.info(f'Storage compression: {self.file.compression_stats.get_stats()}')
         return num_laws_downloaded, output_laws
 
     def __write_metadata(self, output_laws: List[LawElem]):
@@ -76,32 +103,26 @@ class BingDriver:
             os.rmdir(tmp_dir)
 
     def __download_laws(self, output_laws: List[LawElem]) -> int:
-        # Download the PDFs
-        count = 0
-        for law in output_laws:
-            # Download the PDF using requests
-            try:
-                response = requests.get(law.url, verify=False)
-                jurisdiction = law.jurisdiction
-                category = law.category
-                file_name = law.file_name
-                # if the directory doesn't exist create it and do not bail out
-                target_file_path = get_target_file_path(
-                    self.target_base_dir, file_name, jurisdiction, category)
-                self.file.write(response.content, target_file_path)
-                logging.info(
-                    f'Downloaded {file_name} to {target_file_path}')
-                count += 1
-            except Exception as e:
-                logging.error(f'Failed to download {law.url}.')
-                logging.error(e)
-        return count
+        # Download the PDFs concurrently, streaming each of them to the storage backend.
+        downloads = [(law.url, get_target_file_path(self.target_base_dir, law.file_name, law.jurisdiction,
+                                                    law.category))
+                     for law in output_laws]
+        downloader = HttpDownloader(max_workers=self.download_parallelism, max_per_host=self.downloads_per_host,
+                                    file=self.file)
+        try:
+            result = downloader.download_all(downloads, verify=False)
+        finally:
+            downloader.close()
+        logging.info(f'Downloaded {result.num_files} of {len(downloads)} laws ({result.num_bytes} bytes) in '
+                     f'{result.elapsed_seconds:.1f}s: {result.files_per_second:.2f} files/s, '
+                     f'{result.bytes_per_second / 1024 / 1024:.2f} MB/s. {len(result.failed_urls)} failed.')
+        return result.num_files
 
     def __validate_csv_path(self):
         # Check if the CSV file is defined and exists.
         if self.csv_path is None or len(self.csv_path) == 0:
             raise Exception('CSV file path is not defined.')
-        if not os.path.exists(self.csv_path) and not self.csv_path.startswith('s3://'):
+        if not self.csv_path.startswith('s3://') and not self.file.exists(self.csv_path):
             raise Exception(f'CSV file {self.csv_path} does not exist.')
 
     def __read_laws_from_csv(self) -> List[LawElem]:
@@ -141,29 +162,53 @@ class BingDriver:
         return laws
 
     def __search_laws(self, laws: List[LawElem]) -> List[LawElem]:
-        # Use BingClient to search for the law. Return a list of laws with additional information
+        # Use BingClient to search for the laws concurrently (within the rate limit of the Bing tier). Return a list
+        # of laws with additional information. The laws whose search failed are left out instead of failing the run.
+        if self.search_cache_path:
+            self.bing_client.cache = SearchCache(self.search_cache_path, ttl_seconds=self.search_cache_ttl_seconds)
+        try:
+            with ThreadPoolExecutor(max_workers=self.search_parallelism) as executor:
+                futures = [executor.submit(self.__search_law, law) for law in laws]
+        finally:
+            if self.bing_client.cache is not None:
+                logging.info(f'Bing search cache: {self.bing_client.cache.get_stats()}')
+                self.bing_client.cache.close()
+                self.bing_client.cache = None
         output_laws = []
-        for law in laws:
-            query = f'{law.law_name} filetype:pdf'
-            results = self.bing_client.search(query, law.jurisdiction)
-            # Read the first result and extract the title and url and update the JSON
-            if len(results) > 0:
-                # Get the first result that ends with .pdf from the list of results.
-                pdf_result = next(
-                    (x for x in results if x.url.endswith('.pdf')), None)
-                if pdf_result is None:
-                    continue
-                first_result = pdf_result
-                law_name = law.law_name.replace(' ', '_')
-                tmp_file_name = re.sub(
-                    r'[^A-Za-z0-9_.]', '', f'{law_name}.pdf')
-                jurisdiction, category = law.jurisdiction, law.category
-                target_file_path = get_target_file_path(
-                    self.target_base_dir, tmp_file_name, jurisdiction, category)
-                if self.file.exists(target_file_path):
-                    continue
-                law.title = normalize_string(first_result.name)
-                law.url = first_result.url
-                law.file_name = tmp_file_name
-                output_laws.append(law)
+        num_failed = 0
+        for law, future in zip(laws, futures):
+            try:
+                output_law = future.result()
+            except Exception as e:
+                logging.error(f'Failed to search for {law.law_name}: {e}')
+                num_failed += 1
+                continue
+            if output_law is not None:
+                output_laws.append(output_law)
+        logging.info(f'Searched for {len(laws)} laws: found {len(output_laws)} new PDFs, {num_failed} searches failed.')
         return output_laws
+
+    def __search_law(self, law: LawElem) -> Optional[LawElem]:
+        query = f'{law.law_name} filetype:pdf'
+        results = self.bing_client.search(query, law.jurisdiction)
+        # Read the first result and extract the title and url and update the JSON
+        if len(results) == 0:
+            return None
+        # Get the first result that ends with .pdf from the list of results.
+        pdf_result = next(
+            (x for x in results if x.url.endswith('.pdf')), None)
+        if pdf_result is None:
+            return None
+        first_result = pdf_result
+        law_name = law.law_name.replace(' ', '_')
+        tmp_file_name = re.sub(
+            r'[^A-Za-z0-9_.]', '', f'{law_name}.pdf')
+        jurisdiction, category = law.jurisdiction, law.category
+        target_file_path = get_target_file_path(
+            self.target_base_dir, tmp_file_name, jurisdiction, category)
+        if self.file.exists(target_file_path):
+            return None
+        law.title = normalize_string(first_result.name)
+        law.url = first_result.url
+        law.file_name = tmp_file_name
+        return law
@@ -1,6 +1,6 @@
 import concurrent
 import logging
-from typing import Tuple
+from typing import Optional, Tuple
 
 from drivers.runners.bing_driver import BingDriver
 from drivers.runners.site_scraper_driver import SiteScraperDriver
@@ -12,6 +12,17 @@ class RootDriver:
 
     @base_dir: The base directory where all the files will be stored.
     @max_pages_per_domain: The maximum number of pages to crawl per domain.
+    @crawls_per_worker: The number of websites crawled at the same time by each crawl worker process.
+    @incremental_crawl: Whether to skip the pages that did not change since the previous crawl.
+    @law_download_parallelism: The maximum number of law PDFs downloaded at the same time.
+    @law_downloads_per_host: The maximum number of law PDFs downloaded at the same time from the same host.
+    @bing_search_parallelism: The maximum number of Bing searches in flight at the same time.
+    @bing_search_qps: The queries per second allowed by the Bing tier, None for no limit.
+    @bing_search_cache_path: The path of the persistent cache of the Bing search results, None to disable it.
+    @bing_search_cache_ttl_seconds: The time to live of the cached Bing search results.
+    @checkpoint_dir: The local directory where the website crawls are checkpointed to resume them after an interruption.
+    @packed_site_output: Whether to pack the pages of each website into a few compressed shards with an index instead of
+    writing one file per page.
     """
 
     def __init__(self,
@@ -21,10 +32,23 @@ class RootDriver:
                  max_pages_per_domain: int = 10,
                  max_laws: int = -1,
                  max_websites: int = -1,
-                 site_scraper_parallelism: int = 10):
+                 site_scraper_parallelism: int = 10,
+                 crawls_per_worker: int = 1,
+                 incremental_crawl: bool = False,
+                 checkpoint_dir: Optional[str] = None,
+                 packed_site_output: bool = False,
+                 law_download_parallelism: int = 16,
+                 law_downloads_per_host: int = 4,
+                 bing_search_parallelism: int = 8,
+                 bing_search_qps: Optional[float] = None,
+                 bing_search_cache_path: Optional[str] = None,
+                 bing_search_cache_ttl_seconds: float = 30 * 24 * 3600):
         self.site_scraper_parallelism = site_scraper_parallelism
         self.bing_driver = BingDriver(
-            csv_path=laws_metadata_file_path, base_dir=base_dir, max_laws=max_laws)
+            csv_path=laws_metadata_file_path, base_dir=base_dir, max_laws=max_laws,
+            download_parallelism=law_download_parallelism, downloads_per_host=law_downloads_per_host,
+            search_parallelism=bing_search_parallelism, search_qps=bing_search_qps,
+            search_cache_path=bing_search_cache_path, search_cache_ttl_seconds=bing_search_cache_ttl_seconds)
         self.site_scraper_driver = SiteScraperDriver(
             csv_path=site_scraper_metadata_file_path,
             max_pages_per_domain=max_pages_per_domain,
@@ -32,7 +56,11 @@ class RootDriver:
             should_download_pdf=False,
             base_dir=base_dir,
             max_parallelism=site_scraper_parallelism,
-            max_websites=max_websites)
+            max_websites=max_websites,
+            crawls_per_worker=crawls_per_worker,
+            incremental=incremental_crawl,
+            checkpoint_dir=checkpoint_dir,
+            packed_output=packed_site_output)
 
     def run(self) -> Tuple[int, int, int]:
         """
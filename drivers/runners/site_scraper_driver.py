@@ -3,18 +3,18 @@
 import concurrent
 import csv
 import logging
+import math
 import os
 
+from drivers.common.crawl_result import CrawlResult
 from drivers.common.input_elem import InputElem
-from drivers.crawler.utils.helper_methods import extract_domain, extract_file_name_from_url, unify_csv_format
+from drivers.crawler.utils.helper_methods import extract_domain
 from drivers.crawler.website_crawler_scrapy import WebSiteCrawlerScrapy
 from drivers.utilities.file import File
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 RUN_PARALLEL = True
 
-METADATA_FILE_NAME = 'metadata.csv'
-
 
 class SiteScraperDriver:
     def __init__(self, csv_path: str,
@@ -23,9 +23,18 @@ class SiteScraperDriver:
                  should_download_pdf: bool,
                  base_dir: str,
                  max_parallelism: int,
-                 max_websites: int):
+                 max_websites: int,
+                 crawls_per_worker: int = 1,
+                 incremental: bool = False,
+                 checkpoint_dir: Optional[str] = None,
+                 packed_output: bool = False):
         self.file = File()
-        self.scrapy_crawler = WebSiteCrawlerScrapy()
+        # max_parallelism websites are crawled at the same time, crawls_per_worker of them on each crawl worker.
+        self.crawls_per_worker = max(1, min(crawls_per_worker, max_parallelism))
+        self.scrapy_crawler = WebSiteCrawlerScrapy(
+            num_workers=math.ceil(max_parallelism / self.crawls_per_worker),
+            crawls_per_worker=self.crawls_per_worker,
+            packed_output=packed_output)
         self.csv_path = csv_path
         self.max_pages_per_domain = max_pages_per_domain
         self.should_recurse = should_recurse
@@ -34,6 +43,12 @@ class SiteScraperDriver:
         self.max_parallelism = max_parallelism
         self.is_s3_file = base_dir.startswith('s3://')
         self.max_websites = max_websites
+        # Whether to skip the pages that did not change since the previous crawl.
+        self.incremental = incremental
+        # The local directory where the crawls are checkpointed, None disables the checkpoints.
+        self.checkpoint_dir = checkpoint_dir
+        # The stats of the last run, summed over all the websites.
+        self.run_stats = {}
 
     def ping(self) -> str:
         logging.info('Pinging SiteScraperDriver...')
@@ -46,31 +61,45 @@ class SiteScraperDriver:
         if self.max_websites > 0:
             in_elements = in_elements[:self.max_websites]
         num_pages_crawled = 0
+        self.run_stats = {}
         # Find length of in_elements it is a list
         num_websites_crawled = in_elements.__len__()
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_parallelism) as executor:
-            # map the crawling function to each url, returns immediately with future objects
-            future_to_url = {executor.submit(
-                self.__crawl_website, in_element): in_element for in_element in in_elements}
+        with self.scrapy_crawler:
+            # Dispatch every website to the crawl workers, returns immediately with future objects
+            future_to_url = {self.__crawl_website(in_element): in_element for in_element in in_elements}
 
             for future in concurrent.futures.as_completed(future_to_url):
                 in_element = future_to_url[future]
                 try:
-                    url_content_map = future.result()  # get the result (or exception) of the future
+                    crawl_result = future.result()  # get the result (or exception) of the future
                 except Exception as exc:
                     logging.error(
                         f'An error occurred while crawling {in_element.site_name}: {exc}')
                 else:
-                    self.__write_content_metadata_to_files(
-                        in_element, url_content_map)
                     logging.info(
-                        f'Finished crawling {in_element.site_name} with {len(url_content_map)} pages.')
-                    num_pages_crawled += len(url_content_map)
-
-        # Wait for all the futures to complete.
-        concurrent.futures.wait(future_to_url)
-
+                        f'Finished crawling {in_element.site_name} with {crawl_result.num_pages} pages. '
+                        f'{crawl_result.get_stat("budget/links_not_scheduled")} links were not scheduled because of '
+                        f'the page budget, saving ~{crawl_result.get_stat("budget/estimated_bytes_saved")} bytes and '
+                        f'~{crawl_result.get_stat("budget/estimated_cpu_seconds_saved")}s of CPU. '
+                        f'{crawl_result.get_stat("guards/links_skipped_by_extension")} links were skipped by '
+                        f'extension, {crawl_result.get_stat("guards/responses_aborted_by_content_type")} responses '
+                        f'were aborted by content type and {crawl_result.get_stat("guards/responses_aborted_by_size")}'
+                        f' by size, saving {crawl_result.get_stat("guards/bytes_saved")} bytes. The upload queue '
+                        f'reached {crawl_result.get_stat("storage/upload_queue_max_depth")} pages and '
+                        f'{crawl_result.get_stat("storage/pages_waited_for_upload")} pages waited for an upload.')
+                    num_pages_crawled += crawl_result.num_pages
+                    self.__add_to_run_stats(crawl_result)
+
+        logging.info(f'Site scraper run summary: {num_pages_crawled} pages crawled from {num_websites_crawled} '
+                     f'websites, {self.run_stats.get("storage/pages_written", 0)} written, '
+                     f'{self.run_stats.get("storage/pages_unchanged", 0)} unchanged since the previous run.')
+        if self.run_stats.get('storage/compression_compressed_bytes'):
+            raw_bytes = self.run_stats['storage/compression_raw_bytes']
+            compressed_bytes = self.run_stats['storage/compression_compressed_bytes']
+            logging.info(f'Site scraper compression: {raw_bytes} bytes stored as {compressed_bytes} bytes '
+                         f'(ratio {raw_bytes / compressed_bytes:.2f}) in '
+                         f'{self.run_stats.get("storage/compression_seconds", 0):.1f}s of compression.')
         return num_pages_crawled, num_websites_crawled
 
     def __validate_csv_path(self):
@@ -101,59 +130,68 @@ class SiteScraperDriver:
             reader = csv.reader(f)
             # Skip the header
             next(reader, None)
-            # Headers are url, jurisdiction, category
+            # Headers are url, jurisdiction, category, followed by the optional columns filter, max_depth,
+            # priority_patterns and low_priority_patterns. The patterns are regular expressions separated by spaces.
             for line in reader:
                 url = line[0]
                 if not url.startswith("http://") and not url.startswith("https://"):
                     url = "http://" + url
                 allowed_domains = extract_domain(url)
                 in_elements.append(InputElem(url=url, allowed_domains=allowed_domains,
-                                             jurisdiction=line[1], category=line[2]))
+                                             jurisdiction=line[1], category=line[2],
+                                             filter=self.__get_column(line, 3),
+                                             max_depth=self.__get_max_depth(line),
+                                             priority_patterns=self.__get_column(line, 5).split(),
+                                             low_priority_patterns=self.__get_column(line, 6).split()))
 
         # Delete the tmp file
         os.remove(tmp_file_path)
 
         return in_elements
 
-    def __crawl_website(self, in_element: InputElem) -> dict:
-        return self.scrapy_crawler.crawl([in_element.url],
-                                         [in_element.allowed_domains],
-                                         self.should_recurse,
-                                         self.max_pages_per_domain,
-                                         self.should_download_pdf,
-                                         "")
-
-    # Does the following:-
-    # 1. Writes the content of the downloaded pages to separate .txt files.
-    # 2. Writes a csv file with the metadata of the downloaded laws.
+    @staticmethod
+    def __get_column(line: List[str], index: int) -> str:
+        return line[index].strip() if len(line) > index else ''
+
+    # Returns the max_depth column of @line, -1 (no limit) if it is empty or not an integer.
+    def __get_max_depth(self, line: List[str]) -> int:
+        max_depth = self.__get_column(line, 4)
+        if not max_depth:
+            return -1
+        try:
+            return int(max_depth)
+        except ValueError:
+            logging.error(f'Invalid max_depth {max_depth!r} in {self.csv_path}, crawling without a depth limit: {line}')
+            return -1
+
+    # Crawls the website and writes:-
+    # 1. The content of the downloaded pages to separate .txt files, as soon as they are scraped.
+    # 2. A csv file with the metadata of the downloaded pages.
     #    Note: CSV Format is: url, file_name, jurisdiction, category
     #
-    # @url_content_map: A dictionary with the URL as the key and the content of the page as the value.
-    # @return: None
-    def __write_content_metadata_to_files(self, in_element: InputElem, url_content_map: dict) -> None:
-        jurisdiction = in_element.jurisdiction
-        category = in_element.category
-        site_name = in_element.site_name
-
-        target_directory = f'{self.target_base_dir}/{jurisdiction}/{category}/{site_name}'
-
-        data_to_write = []
-        for url, content in url_content_map.items():
-            file_name = extract_file_name_from_url(url)
-            self.file.write(content, f'{target_directory}/{file_name}')
-            data_to_write.append({
-                "title": site_name,
-                "jurisdiction": jurisdiction,
-                "category": category,
-                "url": url,
-                "file_name": file_name
-            })
-
-        with open(METADATA_FILE_NAME, 'w') as f:
-            unify_csv_format(f, data_to_write)
-
-        # Put the metadata file in S3
-        target_file_path = f'{target_directory}/{METADATA_FILE_NAME}'
-        self.file.write_file(f, target_file_path)
-        logging.info(f'Uploading metadata file to {target_file_path}')
-        os.remove(METADATA_FILE_NAME)
+    # @return: A future that resolves to the CrawlResult of the website.
+    def __crawl_website(self, in_element: InputElem) -> concurrent.futures.Future:
+        target_directory = f'{self.target_base_dir}/{in_element.jurisdiction}/{in_element.category}/{in_element.site_name}'
+        page_metadata = {
+            "title": in_element.site_name,
+            "jurisdiction": in_element.jurisdiction,
+            "category": in_element.category
+        }
+        return self.scrapy_crawler.submit([in_element.url],
+                                          [in_element.allowed_domains],
+                                          self.should_recurse,
+                                          self.max_pages_per_domain,
+                                          self.should_download_pdf,
+                                          in_element.filter,
+                                          target_directory,
+                                          page_metadata,
+                                          self.incremental,
+                                          self.checkpoint_dir,
+                                          in_element.max_depth,
+                                          in_element.priority_patterns,
+                                          in_element.low_priority_patterns)
+
+    def __add_to_run_stats(self, crawl_result: CrawlResult):
+        for key, value in crawl_result.stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.run_stats[key] = self.run_stats.get(key, 0) + value
@@ -5,10 +5,16 @@ import json
 # -*- coding: utf-8 -*-
 import logging
 import os
+import random
+import time
+from typing import Optional
 
 import requests
 from bs4 import BeautifulSoup
 
+from drivers.utilities.http_downloader import DEFAULT_TIMEOUT, RETRY_STATUS_CODES, create_http_session
+from drivers.utilities.rate_limiter import TokenBucket
+from drivers.utilities.search_cache import SearchCache
 from drivers.utilities.web_page_info import WebPageInfo
 
 
@@ -45,12 +51,29 @@ def extract_webpage_info(data: str) -> list:
 class BingClient:
     """
     This class is used to search for a query using Bing Search API.
+    The client is thread-safe: the searches share a pool of connections and, when @rate_limiter is set, never exceed
+    its rate. The requests that fail with a connection error, 429 or 5xx are retried with an exponential backoff
+    (honoring Retry-After), each retry taking a token from the rate limiter as well.
+
+    @rate_limiter: The TokenBucket set to the queries per second of the Bing tier, or None for no limit.
+    @max_connections: The size of the pool of connections to the Bing API.
+    @max_retries: The number of retries of a failed request.
+    @backoff_factor: The retries wait backoff_factor * 2^retry seconds, plus some jitter.
+    @cache: The SearchCache of the results, or None. The cached results are returned without calling the API, and
+    the expired ones are still returned when the API fails.
     """
 
-    def __init__(self):
+    def __init__(self, rate_limiter: Optional[TokenBucket] = None, max_connections: int = 10, max_retries: int = 3,
+                 backoff_factor: float = 1.0, cache: Optional[SearchCache] = None):
         self.subscription_key = os.environ.get('BING_SEARCH_V7_SUBSCRIPTION_KEY')
         self.search_url = "https://api.bing.microsoft.com/v7.0/search"
         self.news_search_url = "https://api.bing.microsoft.com/v7.0/news/search"
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.cache = cache
+        # The retries are done by __get, so that each of them goes through the rate limiter.
+        self.session = create_http_session(max_connections_per_host=max_connections, max_hosts=2, max_retries=0)
 
     def news_search(self, search_term: str, source_country: str) -> list:
         webpages = []
@@ -59,14 +82,7 @@ class BingClient:
         try:
             # Construct a request.
             mkt = 'en-US' if source_country == 'United States' else 'en-IN'
-            headers = {"Ocp-Apim-Subscription-Key": self.subscription_key}
-            params = {"q": search_term, "textDecorations": True, "textFormat": "HTML", "mkt": mkt}
-            response = requests.get(self.news_search_url, headers=headers, params=params)
-            response.raise_for_status()
-            search_results = response.json()
-
-            # Print the response in a pretty way.
-            return extract_news_info(search_results)
+            return self.__search('news', self.news_search_url, search_term, mkt, extract_news_info)
 
         except Exception as ex:
             logging.error(f'Exception occurred while calling Bing Search API: {ex}')
@@ -79,15 +95,57 @@ class BingClient:
         try:
             # Construct a request.
             mkt = 'en-US' if source_country == 'United States' else 'en-IN'
-            headers = {"Ocp-Apim-Subscription-Key": self.subscription_key}
-            params = {"q": search_term, "textDecorations": True, "textFormat": "HTML", "mkt": mkt}
-            response = requests.get(self.search_url, headers=headers, params=params)
-            response.raise_for_status()
-            search_results = response.json()
-
-            # Print the response in a pretty way.
-            return extract_webpage_info(search_results)
+            return self.__search('search', self.search_url, search_term, mkt, extract_webpage_info)
 
         except Exception as ex:
             logging.error(f'Exception occurred while calling Bing Search API: {ex}')
-            raise ex
\ No newline at end of file
+            raise ex
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __search(self, endpoint: str, url: str, search_term: str, mkt: str, extract_info) -> list:
+        # Returns the cached results of the search if any, calls the API and caches its results otherwise.
+        if self.cache is not None:
+            cached_webpages = self.cache.get(endpoint, mkt, search_term)
+            if cached_webpages is not None:
+                return [WebPageInfo(page['name'], page['url'], page['snippet']) for page in cached_webpages]
+        headers = {"Ocp-Apim-Subscription-Key": self.subscription_key}
+        params = {"q": search_term, "textDecorations": True, "textFormat": "HTML", "mkt": mkt}
+        try:
+            webpages = extract_info(self.__get(url, headers, params))
+        except Exception as ex:
+            stale_webpages = self.cache.get_stale(endpoint, mkt, search_term) if self.cache is not None else None
+            if stale_webpages is None:
+                raise ex
+            logging.warning(f'Bing Search API failed ({ex}), using the expired cached results of {search_term}')
+            return [WebPageInfo(page['name'], page['url'], page['snippet']) for page in stale_webpages]
+        if self.cache is not None:
+            self.cache.put(endpoint, mkt, search_term,
+                           [{'name': page.name, 'url': page.url, 'snippet': page.snippet} for page in webpages])
+        return webpages
+
+    def __get(self, url: str, headers: dict, params: dict) -> dict:
+        # Sends the request, retrying the connection errors, 429 and 5xx with an exponential backoff.
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, headers=headers, params=params, timeout=DEFAULT_TIMEOUT)
+            except (requests.ConnectionError, requests.Timeout) as ex:
+                if attempt == self.max_retries:
+                    raise ex
+                delay = self.__get_backoff_seconds(attempt)
+                logging.warning(f'Bing Search API request failed ({ex}), retrying in {delay:.1f}s...')
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = self.__get_backoff_seconds(attempt, response.headers.get('Retry-After'))
+                logging.warning(f'Bing Search API returned {response.status_code}, retrying in {delay:.1f}s...')
+            time.sleep(delay)
+
+    def __get_backoff_seconds(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff_factor * (2 ** attempt) + random.uniform(0, self.backoff_factor)
@@ -0,0 +1,139 @@
+import gzip
+import threading
+import time
+from typing import IO, Callable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The gzip compression level, favoring speed.
+GZIP_COMPRESSION_LEVEL = 6
+# The zstd compression level.
+ZSTD_COMPRESSION_LEVEL = 3
+# The size of the chunks compressed from a stream.
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class Codec:
+    """
+    A compression codec of the stored files. The compressed files are stored with the @extension of their codec
+    appended to their path (e.g. page.txt.gz), which tells how to read them back.
+
+    @name: The name of the codec, e.g. in the STORAGE_COMPRESSION setting.
+    @extension: The extension of the files compressed with the codec.
+    @compress: Compresses bytes.
+    @decompress: Decompresses bytes.
+    @compress_stream: Compresses the bytes read from a stream into another stream, and returns the number of bytes
+    read.
+    """
+
+    def __init__(self, name: str, extension: str, compress: Callable[[bytes], bytes],
+                 decompress: Callable[[bytes], bytes], compress_stream: Callable[[IO[bytes], IO[bytes]], int]):
+        self.name = name
+        self.extension = extension
+        self.compress = compress
+        self.decompress = decompress
+        self.compress_stream = compress_stream
+
+    def __str__(self):
+        return f'Codec({self.name}, {self.extension})'
+
+
+def _gzip_compress_stream(source: IO[bytes], target: IO[bytes]) -> int:
+    num_bytes = 0
+    with gzip.GzipFile(fileobj=target, mode='wb', compresslevel=GZIP_COMPRESSION_LEVEL) as f:
+        for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b''):
+            f.write(chunk)
+            num_bytes += len(chunk)
+    return num_bytes
+
+
+def _zstd_compress(contents: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compress(contents)
+
+
+def _zstd_decompress(contents: bytes) -> bytes:
+    # The frames written by a stream compressor do not record their size, so decompress them as a stream.
+    return zstandard.ZstdDecompressor().decompressobj().decompress(contents)
+
+
+def _zstd_compress_stream(source: IO[bytes], target: IO[bytes]) -> int:
+    num_bytes, _ = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).copy_stream(source, target)
+    return num_bytes
+
+
+GZIP = Codec('gzip', '.gz', lambda contents: gzip.compress(contents, compresslevel=GZIP_COMPRESSION_LEVEL),
+             gzip.decompress, _gzip_compress_stream)
+ZSTD = Codec('zstd', '.zst', _zstd_compress, _zstd_decompress, _zstd_compress_stream)
+CODECS = {codec.name: codec for codec in (GZIP, ZSTD)}
+
+
+def get_codec(name: Optional[str]) -> Optional[Codec]:
+    """
+    Returns the Codec named @name, None when @name is empty or 'none'.
+    """
+    if not name or name.lower() == 'none':
+        return None
+    codec = CODECS.get(name.lower())
+    if codec is None:
+        raise Exception(f'Unknown compression codec {name}, expected one of {", ".join(CODECS)} or none.')
+    if codec is ZSTD and zstandard is None:
+        raise Exception('The zstd compression codec requires the zstandard package.')
+    return codec
+
+
+def get_codec_of_path(path: str) -> Optional[Codec]:
+    """
+    Returns the Codec of the file @path from its extension, None if it is not compressed.
+    """
+    for codec in CODECS.values():
+        if path.endswith(codec.extension):
+            return codec
+    return None
+
+
+class CompressionStats:
+    """
+    Counts the bytes compressed and decompressed, and the time spent doing it. Thread-safe.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files_compressed = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.compression_seconds = 0.0
+        self.files_decompressed = 0
+        self.decompression_seconds = 0.0
+
+    def compress(self, codec: Codec, contents: bytes) -> bytes:
+        start = time.monotonic()
+        compressed = codec.compress(contents)
+        self.add_compressed(len(contents), len(compressed), time.monotonic() - start)
+        return compressed
+
+    def decompress(self, codec: Codec, contents: bytes) -> bytes:
+        start = time.monotonic()
+        decompressed = codec.decompress(contents)
+        with self.lock:
+            self.files_decompressed += 1
+            self.decompression_seconds += time.monotonic() - start
+        return decompressed
+
+    def add_compressed(self, raw_bytes: int, compressed_bytes: int, seconds: float) -> None:
+        with self.lock:
+            self.files_compressed += 1
+            self.raw_bytes += raw_bytes
+            self.compressed_bytes += compressed_bytes
+            self.compression_seconds += seconds
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {'files_compressed': self.files_compressed, 'raw_bytes': self.raw_bytes,
+                    'compressed_bytes': self.compressed_bytes,
+                    'ratio': round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else 0,
+                    'compression_seconds': round(self.compression_seconds, 3),
+                    'files_decompressed': self.files_decompressed,
+                    'decompression_seconds': round(self.decompression_seconds, 3)}
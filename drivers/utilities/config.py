@@ -10,4 +10,36 @@ class S3Config:
         self.region_name = os.environ.get('S3_DEFAULT_REGION')
         self.aws_access_key_id = os.environ.get('AWS_ACCESS_KEY_ID')
         self.aws_secret_access_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
-        self.file_signed_url_expiration_seconds = 3600
\ No newline at end of file
+        self.file_signed_url_expiration_seconds = 3600
+        # The endpoint of an S3-compatible storage (e.g. MinIO or LocalStack at http://localhost:9000), None for AWS.
+        self.endpoint_url = os.environ.get('S3_ENDPOINT_URL') or None
+        # The files larger than multipart_threshold are uploaded in parts of multipart_chunksize bytes,
+        # max_concurrency parts at a time. A stream uploaded to S3 holds at most about
+        # multipart_chunksize * max_concurrency bytes in memory.
+        self.multipart_threshold = int(os.environ.get('S3_MULTIPART_THRESHOLD_MB', 8)) * 1024 * 1024
+        self.multipart_chunksize = int(os.environ.get('S3_MULTIPART_CHUNK_SIZE_MB', 8)) * 1024 * 1024
+        self.max_concurrency = int(os.environ.get('S3_MAX_CONCURRENCY', 4))
+        # The objects downloaded to memory (see S3Client.get_fileobj) are spilled to a private temporary file above
+        # this size.
+        self.in_memory_threshold = int(os.environ.get('S3_IN_MEMORY_THRESHOLD_MB', 16)) * 1024 * 1024
+        # The size of the connection pool shared by all the threads of the process.
+        self.max_pool_connections = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', 50))
+        # Whether to create an empty object for each directory of the uploaded files, so that the S3 console shows
+        # them. Each directory is created once per process.
+        self.create_directory_markers = os.environ.get('S3_CREATE_DIRECTORY_MARKERS', 'true').lower() == 'true'
+
+
+class StorageConfig:
+    """
+    This class stores the configurations of the files stored by File, whatever their storage backend.
+    """
+    def __init__(self):
+        # The codec the text files are compressed with when they are written (gzip, or zstd with the zstandard
+        # package), none to write them as they are. The compressed files get the extension of their codec (e.g.
+        # page.txt.gz), and the files written before stay readable.
+        self.compression = os.environ.get('STORAGE_COMPRESSION', 'none')
+        # The extensions of the files compressed when a compression codec is set.
+        self.compressed_extensions = tuple(
+            extension.strip().lower()
+            for extension in os.environ.get('STORAGE_COMPRESSED_EXTENSIONS', '.txt,.csv').split(',')
+            if extension.strip())
@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from drivers.utilities.s3_client import S3Client, extract_bucket_and_key_from_s3_url
+
+
+def split_s3_path(s3_path: str):
+    """
+    Splits @s3_path into the S3 path of its directory (with a trailing slash) and its file name.
+    """
+    directory, _, file_name = s3_path.rpartition('/')
+    return f'{directory}/', file_name
+
+
+class ExistenceIndex:
+    """
+    An in-memory index of the files stored under some S3 directories, to check if files exist without calling S3
+    for each of them.
+
+    The first lookup in a directory lists its files, not those of its subdirectories, with one paginated listing,
+    and their names are kept in a set. The files written during the run are added to the index (see File.write), so
+    the index stays up to date without listing the directory again. A directory listed more than @max_age_seconds ago is listed again on its
+    next lookup, None to never list it again.
+
+    @s3_client: The S3Client used to list the directories.
+    @max_age_seconds: The time after which the listing of a directory is refreshed.
+    """
+
+    def __init__(self, s3_client: Optional[S3Client] = None, max_age_seconds: Optional[float] = None):
+        self.s3_client = s3_client if s3_client else S3Client()
+        self.max_age_seconds = max_age_seconds
+        # The file names of each directory, and the time the directory was listed.
+        self.directories = {}
+        self.listed_at = {}
+        # The files written to the directories that were not listed yet, merged into their listing.
+        self.written_file_names = {}
+        self.lock = threading.Lock()
+        self.directory_locks = {}
+        self.num_listings = 0
+        self.num_lookups = 0
+
+    def exists(self, s3_path: str) -> bool:
+        directory, file_name = split_s3_path(s3_path)
+        file_names = self.__get_file_names(directory)
+        with self.lock:
+            self.num_lookups += 1
+            return file_name in file_names
+
+    def add(self, s3_path: str) -> None:
+        """
+        Records that @s3_path was written.
+        """
+        directory, file_name = split_s3_path(s3_path)
+        with self.lock:
+            if directory in self.directories:
+                self.directories[directory].add(file_name)
+            else:
+                # The file may be written while its directory is listed, so it is merged into the listing.
+                self.written_file_names.setdefault(directory, set()).add(file_name)
+
+    def discard(self, s3_path: str) -> None:
+        directory, file_name = split_s3_path(s3_path)
+        with self.lock:
+            if directory in self.directories:
+                self.directories[directory].discard(file_name)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {'listings': self.num_listings, 'lookups': self.num_lookups,
+                    'files': sum(len(file_names) for file_names in self.directories.values())}
+
+    def __get_file_names(self, directory: str) -> set:
+        # Lists the directory if it was not listed yet, or too long ago. One listing per directory at a time.
+        with self.lock:
+            directory_lock = self.directory_locks.setdefault(directory, threading.Lock())
+        with directory_lock:
+            with self.lock:
+                if directory in self.directories and not self.__is_expired(directory):
+                    return self.directories[directory]
+            bucket_name, prefix = extract_bucket_and_key_from_s3_url(directory)
+            file_names = set()
+            # Only the files of the directory itself: the keys of its subdirectories are not listed.
+            for key in self.s3_client.list_keys(bucket_name, prefix, delimiter='/'):
+                file_name = key[len(prefix):]
+                if file_name and '/' not in file_name:
+                    file_names.add(file_name)
+            logging.info(f'Indexed {len(file_names)} files in {directory}')
+            with self.lock:
+                self.num_listings += 1
+                file_names |= self.written_file_names.pop(directory, set())
+                self.directories[directory] = file_names
+                self.listed_at[directory] = time.monotonic()
+                return file_names
+
+    def __is_expired(self, directory: str) -> bool:
+        return self.max_age_seconds is not None and time.monotonic() - self.listed_at[directory] > self.max_age_seconds
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from typing import IO, List, Optional, Tuple
+
+# The version of the text extraction (see read_local_file). Bump it when the extracted text changes, e.g. a new
+# normalization, so that the texts cached by the previous versions are not used anymore.
+EXTRACTION_VERSION = 1
+# The size of the chunks read to hash a file.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Returns the SHA-256 of the bytes of @file_path, in hex.
+    """
+    with open(file_path, 'rb') as f:
+        return hash_stream(f)
+
+
+def hash_stream(stream: IO[bytes]) -> str:
+    """
+    Returns the SHA-256 of the bytes read from @stream, in hex.
+    """
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class ExtractionCache:
+    """
+    A persistent cache of the text extracted from the documents, stored as files under @directory on the local disk.
+
+    The entries are keyed by the SHA-256 of the bytes of the document, its extension and EXTRACTION_VERSION, so an
+    unchanged document is extracted once, whatever its path, and the entries of another version of the extraction are
+    never used. The entries are written atomically, so that @directory can be shared by several processes or
+    machines. When the entries take more than @max_bytes, the least recently used ones are evicted.
+    The cache is thread-safe and counts its hits, misses and evictions.
+
+    @directory: The directory of the entries.
+    @max_bytes: The maximum size of the entries.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.num_bytes = sum(size for _, size, _ in self.__list_entries())
+
+    @staticmethod
+    def get_key(file_path: str, stream: Optional[IO[bytes]] = None) -> str:
+        """
+        Returns the key of the text of the document @file_path, computed from its bytes.
+        :param stream: The bytes of the document, read to the end, or None to read them from @file_path.
+        """
+        extension = os.path.splitext(file_path)[1].lower()
+        digest = hash_stream(stream) if stream is not None else hash_file(file_path)
+        return hashlib.sha256(f'{EXTRACTION_VERSION}|{extension}|{digest}'.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached text of the document of @key (see get_key()), None if it is not cached.
+        """
+        entry_path = self.__get_entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                contents = f.read()
+            # Mark the entry as recently used.
+            os.utime(entry_path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return contents
+
+    def put(self, key: str, contents: str) -> None:
+        """
+        Caches @contents as the text of the document of @key (see get_key()).
+        """
+        entry_path = self.__get_entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        # Write to a unique temporary file first, so that the readers never see a partial entry.
+        tmp_entry_path = f'{entry_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_entry_path, 'w', encoding='utf-8') as f:
+            f.write(contents)
+        os.replace(tmp_entry_path, entry_path)
+        with self.lock:
+            self.num_bytes += os.path.getsize(entry_path)
+            if self.num_bytes > self.max_bytes:
+                self.__evict()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'bytes': self.num_bytes}
+
+    def __get_entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.txt')
+
+    def __list_entries(self) -> List[Tuple[str, int, float]]:
+        # Returns the (path, size, last access) of the entries, including those written by the other processes.
+        entries = []
+        for sub_directory in os.scandir(self.directory):
+            if not sub_directory.is_dir():
+                continue
+            for entry in os.scandir(sub_directory.path):
+                if entry.name.endswith('.txt'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def __evict(self):
+        # Evict the least recently used entries over max_bytes. Called with the lock held.
+        entries = sorted(self.__list_entries(), key=lambda entry: entry[2])
+        self.num_bytes = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self.num_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.num_bytes -= size
+            self.evictions += 1
+        logging.info(f'Evicted extraction cache entries down to {self.num_bytes} bytes')
@@ -3,24 +3,31 @@ from __future__ import annotations
 
 import logging
 import os
+import codecs
+import io
 import re
 import tempfile
+import time
 import urllib
-from io import StringIO
 from logging.config import dictConfig
 
-import pytesseract
 import requests
-from PIL import Image
-from pdf2image import convert_from_path
-from pdfminer.converter import TextConverter
-from pdfminer.pdfinterp import PDFPageInterpreter
-from pdfminer.pdfinterp import PDFResourceManager
-from pdfminer.pdfpage import PDFPage
 from docx import Document
-from typing import IO
+from typing import IO, Iterable, Iterator, Optional, Tuple
 
+from drivers.utilities.compression import Codec, CompressionStats, get_codec, get_codec_of_path
+from drivers.utilities.config import StorageConfig
+from drivers.utilities.existence_index import ExistenceIndex
+from drivers.utilities.extraction_cache import ExtractionCache
+from drivers.utilities.pdf_extractor import PdfExtractor, count_pages, get_default_pdf_extractor
 from drivers.utilities.s3_client import S3Client
+from drivers.utilities.storage_backend import (LocalStorageBackend, MemoryStorageBackend, S3StorageBackend,
+                                               StorageBackend, get_storage_scheme)
+
+# The size of the chunks read from a stream by File.write_stream.
+STREAM_CHUNK_SIZE = 1024 * 1024
+# The approximate number of characters of the pages of the text and docx files, which have no pages of their own.
+TEXT_PAGE_SIZE = 64 * 1024
 
 dictConfig({
     'version': 1,
@@ -39,64 +46,52 @@ dictConfig({
 })
 
 
-def read_pdf_with_ocr(file_path):
+class IterableStream(io.RawIOBase):
     """
-    This method reads the contents of a PDF using OCR.
-    :param file_path: The path to the PDF file.
-    :return: The contents of the file.
+    A read-only binary file-like object over an iterable of bytes chunks, e.g. response.iter_content(), so that it
+    can be passed to the APIs that read from a file (File.write_stream, S3Client.upload_fileobj).
     """
-    logging.info(f"Reading PDF with OCR: {file_path}")
-    # Step I: Convert PDF to JPG.
-    pdf_pages = convert_from_path(file_path, 500)
-
-    # Step II: Create tempdir if it does not exist
-    tempdir = os.path.join(os.path.dirname(file_path), 'temp')
-    if not os.path.exists(tempdir):
-        os.mkdir(tempdir)
-
-    # Step III: List of image files.
-    image_file_list = []
-    result = ''
-
-    # Step IV: Convert PDF to JPG
-    for page_enumeration, page in enumerate(pdf_pages, start=1):
-        # Create a file name to store the image
-        filename = f"{tempdir}/page_{page_enumeration:03}.jpg"
 
-        # Declaring filename for each page of PDF as JPG
-        # For each page, filename will be:
-        # PDF page 1 -> page_001.jpg
-        # PDF page 2 -> page_002.jpg
-        # PDF page 3 -> page_003.jpg
-        # PDF page n -> page_00n.jpg
-        # ....
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.buffer = b''
 
-        # Save the image of the page in system
-        page.save(filename, "JPEG")
-        image_file_list.append(filename)
-        text = str((pytesseract.image_to_string(Image.open(filename))))
+    def readable(self) -> bool:
+        return True
 
-        # Replace \n with space
-        text = text.replace('-\n', '')
-        result += text
+    def readinto(self, b) -> int:
+        while not self.buffer:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.buffer = chunk
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
 
-        # Delete the temp file.
-        if os.path.exists(filename):
-            os.remove(filename)
 
-    # Step V: Delete the temp directory.
-    if os.path.exists(tempdir):
-        os.rmdir(tempdir)
-
-    # Step VI: Return the result
-    return result
+def read_pdf_with_ocr(file_path, pdf_extractor: Optional[PdfExtractor] = None):
+    """
+    This method reads the contents of a PDF using OCR. The pages are rendered and read one by one, in parallel.
+    :param file_path: The path to the PDF file.
+    :param pdf_extractor: The PdfExtractor used to read the pages, or None for the shared one.
+    :return: The contents of the file.
+    """
+    logging.info(f"Reading PDF with OCR: {file_path}")
+    extractor = pdf_extractor if pdf_extractor else get_default_pdf_extractor()
+    page_texts = extractor.ocr_pages(file_path, list(range(count_pages(file_path))))
+    return ''.join(page_texts[page_number] for page_number in sorted(page_texts))
 
 
-def read_local_file(file_path):
+def iter_local_file_pages(file_path, pdf_extractor: Optional[PdfExtractor] = None) -> Iterator[Tuple[int, str]]:
     """
-    This method reads the contents of a file from the local file system.
+    This method reads the contents of a file from the local file system page by page, so that only a few pages are
+    held in memory at a time. The pages of the text and docx files are chunks of about TEXT_PAGE_SIZE characters.
     :param file_path:
-    :return: The contents of the file.
+    :param pdf_extractor: The PdfExtractor used for the PDFs, or None for the shared one.
+    :return: An iterator over the (page number from 0, contents) of the pages. The contents of the file are the
+    concatenation of the contents of its pages.
     """
     # Raise an exception if the file does not exist.
     if not os.path.exists(file_path):
@@ -104,36 +99,71 @@ def read_local_file(file_path):
 
     logging.info(f"Reading local file: {file_path}")
     if file_path.endswith('.pdf'):  # Check if the input_file_name is a PDF
-        with open(os.path.join(file_path), 'rb') as f:  # Open the PDF and extract its contents
-            resource_manager = PDFResourceManager()
-            string_io = StringIO()
-            converter = TextConverter(resource_manager, string_io)
-            page_interpreter = PDFPageInterpreter(resource_manager, converter)
-            for page in PDFPage.get_pages(f):
-                page_interpreter.process_page(page)
-        file_contents = string_io.getvalue()
-        converter.close()
-        string_io.close()
-        contents_normalized = re.sub('[^a-zA-Z0-9. ]+', '', file_contents)
-        if len(contents_normalized) > 0:
-            return contents_normalized
-        else:
-            file_contents = read_pdf_with_ocr(file_path)
-        return file_contents
+        # Extract its contents, in parallel for the large documents, and read the pages without a text layer (e.g.
+        # scanned pages) with OCR. Only the text layer is normalized, the OCR text is kept as Tesseract read it.
+        extractor = pdf_extractor if pdf_extractor else get_default_pdf_extractor()
+        yield from extractor.iter_pages(file_path, ocr_pages_without_text=True,
+                                        normalize_text=lambda text: re.sub('[^a-zA-Z0-9. ]+', '', text))
+    else:
+        with open(os.path.join(file_path), 'rb') as f:
+            yield from iter_fileobj_pages(f, file_path)
 
+
+def iter_fileobj_pages(fileobj: IO[bytes], file_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    This method reads the contents of a docx or text file from a binary file object page by page, e.g. a file
+    downloaded to memory (see S3Client.get_fileobj). The PDFs are read from a path (see iter_local_file_pages).
+    :param fileobj: The binary file object, positioned at the start of the contents.
+    :param file_path: The path of the file, whose extension tells its type.
+    :return: An iterator over the (page number from 0, contents) of the pages.
+    """
     # Check if the input_file_name is a docx
     if file_path.endswith('.docx'):
-        doc = Document(file_path)
-        fullText = []
-        for paragraph in doc.paragraphs:
-            fullText.append(paragraph.text)
-        return '\n'.join(fullText)
+        doc = Document(fileobj)
+        yield from _group_into_pages(paragraph.text if index == 0 else f'\n{paragraph.text}'
+                                     for index, paragraph in enumerate(doc.paragraphs))
     else:
         # If the input_file_name is not a PDF, it is assumed to be a regular text input_file_name
-        # Open the input_file_name and read its contents
-        with open(os.path.join(file_path), 'r') as f:
-            file_contents = f.read()
-    return file_contents
+        yield from _group_into_pages(_decode_text_chunks(fileobj))
+
+
+def _decode_text_chunks(fileobj: IO[bytes]) -> Iterator[str]:
+    # Decodes the UTF-8 contents of fileobj chunk by chunk, translating the newlines like a file opened in text mode.
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(), translate=True)
+    while True:
+        chunk = fileobj.read(TEXT_PAGE_SIZE)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            yield text
+        if not chunk:
+            return
+
+
+def _group_into_pages(pieces: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    # Groups the pieces of text (e.g. paragraphs) into pages of about TEXT_PAGE_SIZE characters.
+    page_number = 0
+    page = []
+    page_size = 0
+    for piece in pieces:
+        page.append(piece)
+        page_size += len(piece)
+        if page_size >= TEXT_PAGE_SIZE:
+            yield page_number, ''.join(page)
+            page_number += 1
+            page = []
+            page_size = 0
+    if page or page_number == 0:
+        yield page_number, ''.join(page)
+
+
+def read_local_file(file_path, pdf_extractor: Optional[PdfExtractor] = None):
+    """
+    This method reads the contents of a file from the local file system (see iter_local_file_pages).
+    :param file_path:
+    :param pdf_extractor: The PdfExtractor used for the PDFs, or None for the shared one.
+    :return: The contents of the file.
+    """
+    return ''.join(page_text for _, page_text in iter_local_file_pages(file_path, pdf_extractor))
 
 
 def read_local_file_with_ocr(file_path):
@@ -142,16 +172,7 @@ def read_local_file_with_ocr(file_path):
     :param file_path:
     :return: The contents of the file.
     """
-    with open(os.path.join(file_path), 'rb') as f:  # Open the PDF and extract its contents
-        resource_manager = PDFResourceManager()
-        string_io = StringIO()
-        converter = TextConverter(resource_manager, string_io)
-        page_interpreter = PDFPageInterpreter(resource_manager, converter)
-        for page in PDFPage.get_pages(f):
-            page_interpreter.process_page(page)
-    contents = string_io.getvalue()
-    converter.close()
-    string_io.close()
+    contents = get_default_pdf_extractor().extract_text(file_path)
     return contents
 
 
@@ -164,12 +185,46 @@ class File:
     3. Reading a text file from S3. (Done)
     4. Reading a text file from the local file system. (DONE)
     5. Reading a docx file from the local file system. (DONE)
+
+    The files are stored by the StorageBackend of the scheme of their path (see get_storage_scheme): s3:// on S3,
+    memory:// in memory (shared by the processes of the machine) and the other paths on the local file system. More
+    backends can be added to storage_backends.
+
+    When a compression codec is configured (see StorageConfig), the files with one of the compressed extensions are
+    compressed when they are written, and stored with the extension of the codec (e.g. page.txt.gz). They are read,
+    checked and deleted by their original path, and the files written before the compression was enabled stay
+    readable. The files whose path has the extension of a codec are decompressed when they are read.
     """
 
-    def __init__(self):
+    def __init__(self, existence_index: Optional[ExistenceIndex] = None,
+                 pdf_extractor: Optional[PdfExtractor] = None, extraction_cache: Optional[ExtractionCache] = None,
+                 storage_config: Optional[StorageConfig] = None):
         # The S3 client is used to read files from S3.
         self.s3_client = S3Client()
         self.contents = ''
+        # The ExistenceIndex used by exists() for the files on S3, kept up to date with the files written, or None.
+        self.existence_index = existence_index
+        # The PdfExtractor used to read the PDFs, or None for the shared one.
+        self.pdf_extractor = pdf_extractor
+        # The ExtractionCache of the text read from the stored files, or None.
+        self.extraction_cache = extraction_cache
+        # The StorageBackend of each URI scheme.
+        self.storage_backends = {
+            's3': S3StorageBackend(self.s3_client),
+            'file': LocalStorageBackend(),
+            'memory': MemoryStorageBackend(),
+        }
+        self.storage_config = storage_config if storage_config else StorageConfig()
+        # The Codec the files are compressed with when they are written, or None.
+        self.codec = get_codec(self.storage_config.compression)
+        # The bytes compressed and decompressed by this File, and the time spent doing it.
+        self.compression_stats = CompressionStats()
+
+    def get_storage_backend(self, file_path: str) -> StorageBackend:
+        scheme = get_storage_scheme(file_path)
+        if scheme not in self.storage_backends:
+            raise Exception(f'No storage backend for the {scheme} scheme of {file_path}.')
+        return self.storage_backends[scheme]
 
     def read(self, file_path: str) -> str:
         """
@@ -177,35 +232,78 @@ class File:
         :param file_path: The path of the file.
         :return: The contents of the file.
         """
-        # Step I: Check if the file is on S3.
         logging.info(f"Reading file: {file_path}")
-        if file_path.startswith('s3://'):
-            self.__read_file_from_s3(file_path)
-        elif file_path.startswith('http') or file_path.startswith('https'):
+        if file_path.startswith('http') or file_path.startswith('https'):
             response = requests.get(file_path)
             self.contents = response.text
         else:
-            self.contents = read_local_file(file_path)
+            self.__read_file_from_storage(file_path)
         return self.contents
 
+    def iter_pages(self, file_path: str) -> Iterator[Tuple[int, str]]:
+        """
+        This method reads the contents of a file page by page (see iter_local_file_pages), so that the large documents
+        can be processed with a bounded memory. The pages are not cached.
+        :param file_path: The path of the file.
+        :return: An iterator over the (page number from 0, contents) of the pages.
+        """
+        logging.info(f"Reading file by pages: {file_path}")
+        if file_path.startswith('http') or file_path.startswith('https'):
+            yield 0, requests.get(file_path).text
+            return
+        file_path = urllib.parse.unquote(file_path) if file_path.startswith('s3://') else file_path  # noqa
+        file_path = self.__find_stored_path(file_path)
+        storage_backend = self.get_storage_backend(file_path)
+        codec = get_codec_of_path(file_path)
+        if codec is not None:
+            yield from iter_fileobj_pages(self.__open_decompressed(file_path, codec),
+                                          file_path[:-len(codec.extension)])
+        elif file_path.endswith('.pdf') or isinstance(storage_backend, LocalStorageBackend):
+            # The PDFs are read from a file by the extraction workers, and the local files in place.
+            with storage_backend.local_copy(file_path) as local_file_path:
+                yield from iter_local_file_pages(local_file_path, self.pdf_extractor)
+        else:
+            with storage_backend.open(file_path) as fileobj:
+                yield from iter_fileobj_pages(fileobj, file_path)
+
+    def read_bytes(self, file_path: str, offset: int = 0, length: Optional[int] = None) -> bytes:
+        """
+        This method reads the raw bytes of a stored file, without extracting its text or decompressing it.
+        :param file_path: The path of the file.
+        :param offset: The position of the first byte to read.
+        :param length: The number of bytes to read, None to read the whole file. A range is read with a single ranged
+        request on S3.
+        :return: The bytes read.
+        """
+        storage_backend = self.get_storage_backend(file_path)
+        if length is not None:
+            return storage_backend.read_range(file_path, offset, length)
+        with storage_backend.open(file_path) as fileobj:
+            fileobj.seek(offset)
+            return fileobj.read()
+
+    def iter_files(self, directory: str) -> Iterator[str]:
+        """
+        This method lists the files under a directory, including those of its subdirectories.
+        :param directory: The path of the directory.
+        :return: An iterator over the file names, relative to the directory.
+        """
+        return self.get_storage_backend(directory).iter_files(directory)
+
     def exists(self, file_location) -> bool:
         """
         This method checks if a file exists.
         :param file_location: The location of the file.
         :return: True if the file exists, False otherwise.
         """
-        # Step I: Check if the file is on S3.
-        if file_location.startswith('s3://'):
-            return self.s3_client.exists(file_location)
-
-        # Step II: Check if the file is a URL.
-        elif file_location.startswith('http') or file_location.startswith('https'):
+        # Step I: Check if the file is a URL.
+        if file_location.startswith('http') or file_location.startswith('https'):
             response = requests.head(file_location)
             return response.status_code == 200
 
-        # Step III: The file is assumed to be local.
-        else:
-            return os.path.exists(file_location)
+        # Step III: Check the storage, for the compressed file or the file written as is.
+        stored_path = self.get_stored_path(file_location)
+        return self.__exists(stored_path) or (stored_path != file_location and self.__exists(file_location))
 
     def delete(self, file_path: str) -> None:
         """
@@ -213,11 +311,10 @@ class File:
         :param file_path: The path of the file.
         """
         logging.info(f"Deleting file: {file_path}")
-        if file_path.startswith('s3://'):
-            raise Exception("Deleting files from S3 is not supported.")
-        else:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        stored_path = self.get_stored_path(file_path)
+        self.get_storage_backend(file_path).delete(stored_path)
+        if stored_path != file_path:
+            self.get_storage_backend(file_path).delete(file_path)
 
     def write_file(self, in_file: IO[any], target_file_path: str) -> None:
         # Use write() method to write the contents to the target file.
@@ -227,47 +324,128 @@ class File:
         """
         This method writes the contents to a file.
         :param contents: The content to write.
-        :param file_path: The path of the file.
+        :param file_path: The path of the file. The file is compressed if its extension is one of the compressed
+        extensions (see get_stored_path()).
         """
         logging.info(
             f"Number of characters to write: {len(contents)} to file: {file_path}")
-        if file_path.startswith('s3://'):
-            tmp_file = tempfile.mkstemp()[1]
-            # Check if the contents are bytes.
-            if isinstance(contents, bytes):
-                # Write the contents to a temp file and upload it to S3.
-                with open(tmp_file, 'wb') as f:
-                    f.write(contents)
-            else:
-                # Write the contents to a temp file and upload it to S3.
-                with open(tmp_file, 'w') as f:
-                    f.write(contents)
-            self.s3_client.upload_file(tmp_file, file_path)
+        codec = self.__get_write_codec(file_path)
+        if codec is not None:
+            contents = self.compression_stats.compress(
+                codec, contents.encode('utf-8') if isinstance(contents, str) else contents)
+            file_path += codec.extension
+        self.get_storage_backend(file_path).write(contents, file_path)
+        self.__add_to_existence_index(file_path)
+
+    def write_stream(self, stream: IO[bytes] | Iterable[bytes], file_path: str) -> None:
+        """
+        This method writes the bytes read from a stream to a file, chunk by chunk, without holding them in memory.
+        On S3 the stream is uploaded in parts (see S3Config), so the memory used is bounded by the part size.
+        :param stream: A file-like object opened in binary mode (e.g. the raw body of an HTTP response), or an
+        iterable of bytes chunks (e.g. response.iter_content()).
+        :param file_path: The path of the file.
+        """
+        logging.info(f"Streaming to file: {file_path}")
+        if not hasattr(stream, 'read'):
+            # Buffered, so that every read returns the size asked for: s3transfer reads the whole stream into memory
+            # when the first read of a non-seekable stream is short.
+            stream = io.BufferedReader(IterableStream(stream), STREAM_CHUNK_SIZE)
+        codec = self.__get_write_codec(file_path)
+        if codec is not None:
+            # Compress to a private temporary file first, spilled to the disk beyond a few chunks.
+            with tempfile.SpooledTemporaryFile(max_size=4 * STREAM_CHUNK_SIZE) as compressed:
+                start = time.monotonic()
+                raw_bytes = codec.compress_stream(stream, compressed)
+                self.compression_stats.add_compressed(raw_bytes, compressed.tell(), time.monotonic() - start)
+                compressed.seek(0)
+                file_path += codec.extension
+                self.get_storage_backend(file_path).write_stream(compressed, file_path)
+        else:
+            self.get_storage_backend(file_path).write_stream(stream, file_path)
+        self.__add_to_existence_index(file_path)
+
+    def get_stored_path(self, file_path: str) -> str:
+        """
+        This method returns the path a file is written to: the path with the extension of the compression codec when
+        the file is compressed, the path as is otherwise.
+        :param file_path: The path of the file.
+        :return: The path of the stored file.
+        """
+        codec = self.__get_write_codec(file_path)
+        return file_path + codec.extension if codec is not None else file_path
+
+    def __get_write_codec(self, file_path: str) -> Optional[Codec]:
+        # The files already compressed, e.g. the page shards, are written as they are.
+        if self.codec is None or get_codec_of_path(file_path) is not None:
+            return None
+        extension = os.path.splitext(file_path)[1].lower()
+        return self.codec if extension in self.storage_config.compressed_extensions else None
+
+    def __find_stored_path(self, file_path: str) -> str:
+        # Returns the compressed file of file_path if there is one, or file_path, e.g. written before the compression
+        # was enabled.
+        stored_path = self.get_stored_path(file_path)
+        if stored_path != file_path and self.__exists(stored_path):
+            return stored_path
+        return file_path
+
+    def __exists(self, file_path: str) -> bool:
+        if file_path.startswith('s3://') and self.existence_index is not None:
+            return self.existence_index.exists(file_path)
+        return self.get_storage_backend(file_path).exists(file_path)
+
+    def __open_decompressed(self, file_path: str, codec: Codec) -> IO[bytes]:
+        # The compressed files are text, small enough to be decompressed in memory.
+        with self.get_storage_backend(file_path).open(file_path) as fileobj:
+            return io.BytesIO(self.compression_stats.decompress(codec, fileobj.read()))
+
+    def __add_to_existence_index(self, file_path: str) -> None:
+        if self.existence_index is not None and file_path.startswith('s3://'):
+            self.existence_index.add(file_path)
+
+    def __read_local_file(self, file_path: str) -> str:
+        # Reads the file, or returns its cached text if the same bytes were already read.
+        return self.__read_with_cache(file_path, lambda: read_local_file(file_path, self.pdf_extractor))
+
+    def __read_fileobj(self, fileobj: IO[bytes], file_path: str) -> str:
+        # Reads the file object, or returns its cached text if the same bytes were already read.
+        return self.__read_with_cache(
+            file_path, lambda: ''.join(page_text for _, page_text in iter_fileobj_pages(fileobj, file_path)), fileobj)
+
+    def __read_with_cache(self, file_path: str, read, fileobj: Optional[IO[bytes]] = None) -> str:
+        if self.extraction_cache is None:
+            return read()
+        key = self.extraction_cache.get_key(file_path, fileobj)
+        contents = self.extraction_cache.get(key)
+        if contents is None:
+            if fileobj is not None:
+                fileobj.seek(0)
+            contents = read()
+            self.extraction_cache.put(key, contents)
         else:
-            # Check if the directory exists. If not create it.
-            directory = os.path.dirname(file_path)
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            if isinstance(contents, bytes):
-                with open(file_path, 'wb') as f:
-                    f.write(contents)
-            else:
-                with open(file_path, 'w') as f:
-                    f.write(contents)
-
-    def __read_file_from_s3(self, file_path: str) -> str:
+            logging.info(f"Using the cached text of {file_path}")
+        return contents
+
+    def __read_file_from_storage(self, file_path: str) -> str:
         """
-        This method reads the contents of a file from S3.
+        This method reads the contents of a file from its StorageBackend. The local files are read in place, and the
+        others through memory, except the PDFs, which are copied to a private temporary file for the extraction
+        workers.
         :param file_path:
         :return:
         """
-        logging.info(f"Reading file from S3: {file_path}")
-        # Get the bucket name and file name.
-        file_path_decoded = urllib.parse.unquote(file_path)  # noqa
-        # Read the file from S3.
-        tmp_file = self.s3_client.get_file(file_path_decoded)
-        self.contents = read_local_file(tmp_file)
-        # Delete the temp file.
-        if os.path.exists(tmp_file):
-            os.remove(tmp_file)
+        file_path_decoded = urllib.parse.unquote(file_path) if file_path.startswith('s3://') else file_path  # noqa
+        file_path_decoded = self.__find_stored_path(file_path_decoded)
+        storage_backend = self.get_storage_backend(file_path_decoded)
+        codec = get_codec_of_path(file_path_decoded)
+        if codec is not None:
+            # Read the decompressed contents as the file without the extension of the codec.
+            self.contents = self.__read_fileobj(self.__open_decompressed(file_path_decoded, codec),
+                                                file_path_decoded[:-len(codec.extension)])
+        elif file_path_decoded.endswith('.pdf') or isinstance(storage_backend, LocalStorageBackend):
+            with storage_backend.local_copy(file_path_decoded) as local_file_path:
+                self.contents = self.__read_local_file(local_file_path)
+        else:
+            with storage_backend.open(file_path_decoded) as fileobj:
+                self.contents = self.__read_fileobj(fileobj, file_path_decoded)
         return self.contents
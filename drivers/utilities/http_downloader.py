@@ -0,0 +1,155 @@
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from drivers.common.download_result import DownloadResult
+from drivers.utilities.file import File
+
+# The (connect, read) timeouts of the requests in seconds.
+DEFAULT_TIMEOUT = (10, 60)
+# The status codes that are worth retrying.
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+
+def get_host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def create_http_session(max_connections_per_host: int = 4, max_hosts: int = 32, max_retries: int = 3,
+                        backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Creates a requests Session that keeps a pool of connections per host and retries the failed requests.
+    :param max_connections_per_host: The size of the connection pool of each host. The requests wait for a free
+    connection instead of opening more.
+    :param max_hosts: The number of host pools kept open.
+    :param max_retries: The number of retries of the connection errors and of the RETRY_STATUS_CODES. The last
+    response is returned when the retries are exhausted.
+    :param backoff_factor: The retries wait backoff_factor * 2^(retry - 1) seconds (honoring Retry-After).
+    :return: The session.
+    """
+    retry = Retry(total=max_retries, backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS_CODES,
+                  allowed_methods=['HEAD', 'GET'], respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=max_hosts, pool_maxsize=max_connections_per_host, max_retries=retry,
+                          pool_block=True)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class _CountingReader:
+    """
+    Wraps a file-like object and counts the bytes read from it.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.num_bytes = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.num_bytes += len(data)
+        return data
+
+
+class HttpDownloader:
+    """
+    Downloads files concurrently and streams them straight to the storage backend (see File.write_stream), so a
+    file is never held in memory as a whole.
+
+    The downloads share a session with a pool of connections per host (see create_http_session). At most
+    @max_workers files are downloaded at the same time, and at most @max_per_host of them from the same host: the
+    downloads of a batch are queued per host, and a download is only handed to a worker when its host has a free
+    slot, so that the downloads of a busy host never hold the workers needed by the other hosts.
+
+    @max_workers: The maximum number of files downloaded at the same time.
+    @max_per_host: The maximum number of files downloaded at the same time from the same host.
+    @timeout: The (connect, read) timeouts of the requests in seconds.
+    @max_retries: The number of retries of a failed request, with an exponential backoff.
+    """
+
+    def __init__(self, max_workers: int = 16, max_per_host: int = 4, timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+                 max_retries: int = 3, backoff_factor: float = 0.5, file: Optional[File] = None):
+        # No download could ever start, and download_all() would never return.
+        if max_workers < 1 or max_per_host < 1:
+            raise Exception(f'Invalid download limits: max_workers={max_workers}, max_per_host={max_per_host}, '
+                            f'both must be at least 1.')
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.session = create_http_session(max_connections_per_host=max_per_host, max_hosts=max(max_workers, 10),
+                                           max_retries=max_retries, backoff_factor=backoff_factor)
+        self.file = file if file else File()
+
+    def download(self, url: str, target_file_path: str, verify: bool = True) -> int:
+        """
+        Downloads @url to @target_file_path. The limit of downloads per host only applies to download_all().
+        :param verify: Whether to verify the TLS certificate of the server.
+        :return: The number of bytes downloaded.
+        """
+        with self.session.get(url, stream=True, timeout=self.timeout, verify=verify) as response:
+            response.raise_for_status()
+            # Decode the Content-Encoding (e.g. gzip) while streaming.
+            response.raw.decode_content = True
+            reader = _CountingReader(response.raw)
+            self.file.write_stream(reader, target_file_path)
+            return reader.num_bytes
+
+    def download_all(self, downloads: List[Tuple[str, str]], verify: bool = True) -> DownloadResult:
+        """
+        Downloads the (url, target_file_path) pairs of @downloads concurrently.
+        :param verify: Whether to verify the TLS certificates of the servers.
+        :return: The DownloadResult of the batch.
+        """
+        result = DownloadResult()
+        start = time.monotonic()
+        # The downloads not started yet, queued by host, and the number of downloads in flight of each host.
+        host_queues = {}
+        for url, target_file_path in downloads:
+            host_queues.setdefault(get_host(url), deque()).append((url, target_file_path))
+        host_downloads = dict.fromkeys(host_queues, 0)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            future_to_download = {}
+            while host_queues or future_to_download:
+                # Start the downloads of the hosts with a free slot, taking the hosts in turn, until the workers are
+                # busy or every host with downloads left is at its limit.
+                started = True
+                while started and len(future_to_download) < self.max_workers:
+                    started = False
+                    for host in list(host_queues):
+                        if len(future_to_download) >= self.max_workers:
+                            break
+                        if host_downloads[host] >= self.max_per_host:
+                            continue
+                        url, target_file_path = host_queues[host].popleft()
+                        if not host_queues[host]:
+                            del host_queues[host]
+                        host_downloads[host] += 1
+                        future = executor.submit(self.download, url, target_file_path, verify)
+                        future_to_download[future] = (host, url, target_file_path)
+                        started = True
+                done, _ = wait(future_to_download, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host, url, target_file_path = future_to_download.pop(future)
+                    host_downloads[host] -= 1
+                    try:
+                        num_bytes = future.result()
+                    except Exception as e:
+                        logging.error(f'Failed to download {url}: {e}')
+                        result.failed_urls.append(url)
+                    else:
+                        logging.info(f'Downloaded {url} ({num_bytes} bytes) to {target_file_path}')
+                        result.num_files += 1
+                        result.num_bytes += num_bytes
+        result.elapsed_seconds = time.monotonic() - start
+        return result
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,316 @@
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from io import StringIO
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pytesseract
+from pdf2image import convert_from_path
+from pdfminer.converter import TextConverter
+from pdfminer.pdfinterp import PDFPageInterpreter
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.pdfdocument import PDFDocument, PDFTextExtractionNotAllowed
+from pdfminer.pdfpage import LITERAL_PAGE, LITERAL_PAGES, PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import dict_value, list_value, resolve1
+
+# The number of pages extracted by a worker at a time.
+PAGES_PER_CHUNK = 8
+# The time after which the extraction of a document is abandoned.
+DEFAULT_TIMEOUT_SECONDS = 300
+# The resolution the pages are rendered at for OCR.
+OCR_DPI = 500
+# The number of tasks per worker submitted ahead of the pages being consumed (see PdfExtractor.iter_pages()).
+TASKS_AHEAD_PER_WORKER = 2
+# The interval at which the extractions waiting for the workers check that their pool was not restarted.
+POOL_POLL_SECONDS = 1.0
+
+
+def count_pages(file_path: str) -> int:
+    """
+    Returns the number of pages of the PDF @file_path, from the /Count of its page tree when it has one, without
+    reading the pages.
+    """
+    with open(file_path, 'rb') as f:
+        document = PDFDocument(PDFParser(f))
+        try:
+            count = resolve1(dict_value(document.catalog['Pages']).get('Count'))
+        except KeyError:
+            count = None
+        if isinstance(count, int) and count > 0:
+            return count
+        return sum(1 for _ in PDFPage.create_pages(document))
+
+
+def _iter_document_pages(document: PDFDocument, first_page: int = 0) -> Iterator[PDFPage]:
+    # Like PDFPage.create_pages(), but starts at the page first_page: the subtrees of the page tree before it are
+    # skipped by their /Count, so the pages before first_page are not resolved.
+    pages_to_skip = first_page
+    num_pages_found = 0
+
+    def search(obj, parent: dict) -> Iterator[PDFPage]:
+        nonlocal pages_to_skip, num_pages_found
+        if isinstance(obj, int):
+            objid = obj
+            tree = dict_value(document.getobj(objid)).copy()
+        else:
+            objid = obj.objid
+            tree = dict_value(obj).copy()
+        for key, value in parent.items():
+            if key in PDFPage.INHERITABLE_ATTRS and key not in tree:
+                tree[key] = value
+        if tree.get('Type') is LITERAL_PAGES and 'Kids' in tree:
+            count = resolve1(tree.get('Count'))
+            if isinstance(count, int) and 0 < count <= pages_to_skip:
+                pages_to_skip -= count
+                num_pages_found += count
+                return
+            for kid in list_value(tree['Kids']):
+                yield from search(kid, tree)
+        elif tree.get('Type') is LITERAL_PAGE:
+            num_pages_found += 1
+            if pages_to_skip:
+                pages_to_skip -= 1
+                return
+            yield PDFPage(document, objid, tree)
+
+    if 'Pages' in document.catalog:
+        yield from search(document.catalog['Pages'], document.catalog)
+    if not num_pages_found:
+        # Fall back to create_pages(), which finds the pages of the documents without a page tree.
+        yield from islice(PDFPage.create_pages(document), first_page, None)
+
+
+def has_text(page_text: str) -> bool:
+    """
+    Returns whether @page_text has some letters or digits, i.e. whether its page has a text layer.
+    """
+    return bool(re.sub('[^a-zA-Z0-9.]+', '', page_text))
+
+
+def iter_page_texts(file_path: str, first_page: int = 0, last_page: Optional[int] = None) -> Iterator[str]:
+    """
+    Extracts the text of the pages [@first_page, @last_page) of the PDF @file_path one by one, all the pages from
+    @first_page when @last_page is None.
+    :return: An iterator over the text of each page, followed by a form feed.
+    """
+    resource_manager = PDFResourceManager()
+    string_io = StringIO()
+    converter = TextConverter(resource_manager, string_io)
+    page_interpreter = PDFPageInterpreter(resource_manager, converter)
+    try:
+        with open(file_path, 'rb') as f:
+            document = PDFDocument(PDFParser(f))
+            if not document.is_extractable:
+                raise PDFTextExtractionNotAllowed(f'Text extraction is not allowed: {file_path}')
+            pages = _iter_document_pages(document, first_page)
+            if last_page is not None:
+                pages = islice(pages, max(0, last_page - first_page))
+            for page in pages:
+                page_interpreter.process_page(page)
+                page_text = string_io.getvalue()
+                string_io.seek(0)
+                string_io.truncate()
+                yield page_text
+    finally:
+        converter.close()
+        string_io.close()
+
+
+def extract_page_texts(file_path: str, first_page: int = 0, last_page: Optional[int] = None) -> List[str]:
+    """
+    Extracts the text of the pages [@first_page, @last_page) of the PDF @file_path, all the pages from @first_page
+    when @last_page is None.
+    :return: The text of each page, followed by a form feed.
+    """
+    return list(iter_page_texts(file_path, first_page, last_page))
+
+
+def ocr_page(file_path: str, page_number: int, dpi: int = OCR_DPI) -> str:
+    """
+    Reads the text of the page @page_number (from 0) of the PDF @file_path with OCR. Only this page is rendered, and
+    its image is passed to Tesseract in memory.
+    """
+    images = convert_from_path(file_path, dpi, first_page=page_number + 1, last_page=page_number + 1)
+    text = ''.join(str(pytesseract.image_to_string(image)) for image in images)
+    # Join the words hyphenated across lines.
+    return text.replace('-\n', '')
+
+
+def _extract_page_range(page_range: Tuple[str, int, int]) -> List[str]:
+    # Runs in the worker processes.
+    file_path, first_page, last_page = page_range
+    return extract_page_texts(file_path, first_page, last_page)
+
+
+def _ocr_page(page: Tuple[str, int, int]) -> str:
+    # Runs in the worker processes.
+    file_path, page_number, dpi = page
+    return ocr_page(file_path, page_number, dpi)
+
+
+class PdfExtractor:
+    """
+    Extracts the text of the PDFs in parallel: a document is split into ranges of @pages_per_chunk pages, which are
+    extracted by a pool of @max_workers processes and joined back in order. The result is the same as extracting the
+    pages one after the other. The pages without a text layer can be read with OCR by the same pool, one page per
+    task, each worker rendering only the page it reads (see ocr_pages()).
+
+    The documents of at most @pages_per_chunk pages, or all of them when @max_workers is 1, are extracted in the
+    calling process. The pool is created on the first parallel extraction and shared by the threads using the
+    extractor. When waiting for the pages of a document takes longer than @timeout_seconds, its extraction fails and the
+    pool is restarted, so that no worker stays stuck on it. The restart fails the other extractions using the pool as
+    well, e.g. the text extraction of a document whose OCR timed out, as soon as they wait for it.
+
+    @max_workers: The number of worker processes. Defaults to the number of CPUs.
+    @pages_per_chunk: The number of pages extracted by a worker at a time.
+    @timeout_seconds: The time after which the extraction of a document is abandoned.
+    @ocr_dpi: The resolution the pages are rendered at for OCR.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_chunk: int = PAGES_PER_CHUNK,
+                 timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS, ocr_dpi: int = OCR_DPI):
+        self.max_workers = max_workers if max_workers else (os.cpu_count() or 1)
+        self.pages_per_chunk = pages_per_chunk
+        self.timeout_seconds = timeout_seconds
+        self.ocr_dpi = ocr_dpi
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def extract_text(self, file_path: str) -> str:
+        """
+        Extracts the text of the PDF @file_path.
+        :return: The text of the pages in order, each followed by a form feed.
+        """
+        return ''.join(page_text for _, page_text in self.iter_pages(file_path))
+
+    def iter_pages(self, file_path: str, ocr_pages_without_text: bool = False,
+                   normalize_text: Optional[Callable[[str], str]] = None) -> Iterator[Tuple[int, str]]:
+        """
+        Extracts the text of the PDF @file_path page by page. The workers extract a few ranges of pages ahead of the
+        pages consumed, so only these ranges are held in memory whatever the size of the document.
+        :param ocr_pages_without_text: Whether to read the pages without a text layer with OCR (see has_text()).
+        :param normalize_text: Applied to the text of the pages read from their text layer, not to the pages read
+        with OCR, which is returned as Tesseract read it.
+        :return: An iterator over the (page number from 0, text) of the pages in order.
+        """
+        num_pages = count_pages(file_path)
+        start = time.monotonic()
+        if self.max_workers <= 1 or num_pages <= self.pages_per_chunk:
+            page_ranges = self.__iter_chunks(iter_page_texts(file_path))
+        else:
+            page_ranges = self.__imap(_extract_page_range,
+                                      [(file_path, first_page, min(first_page + self.pages_per_chunk, num_pages))
+                                       for first_page in range(0, num_pages, self.pages_per_chunk)],
+                                      file_path)
+        page_number = 0
+        for page_texts in page_ranges:
+            pages_without_text = [page_number + index for index, page_text in enumerate(page_texts)
+                                  if not has_text(page_text)] if ocr_pages_without_text else []
+            ocr_texts = self.ocr_pages(file_path, pages_without_text) if pages_without_text else {}
+            for page_text in page_texts:
+                if page_number in ocr_texts:
+                    yield page_number, ocr_texts[page_number]
+                else:
+                    yield page_number, normalize_text(page_text) if normalize_text else page_text
+                page_number += 1
+        logging.info(f'Extracted {num_pages} pages of {file_path} with {self.max_workers} workers in '
+                     f'{time.monotonic() - start:.1f}s')
+
+    def ocr_pages(self, file_path: str, page_numbers: List[int]) -> Dict[int, str]:
+        """
+        Reads the pages @page_numbers (from 0) of the PDF @file_path with OCR, in parallel.
+        :return: The text of each page, by page number.
+        """
+        start = time.monotonic()
+        tasks = [(file_path, page_number, self.ocr_dpi) for page_number in page_numbers]
+        if self.max_workers <= 1:
+            texts = [_ocr_page(task) for task in tasks]
+        else:
+            texts = list(self.__imap(_ocr_page, tasks, file_path))
+        logging.info(f'Read {len(page_numbers)} pages of {file_path} with OCR in {time.monotonic() - start:.1f}s')
+        return dict(zip(page_numbers, texts))
+
+    def close(self) -> None:
+        with self.lock:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool.join()
+                self.pool = None
+
+    def __iter_chunks(self, page_texts: Iterator[str]) -> Iterator[List[str]]:
+        # Groups the pages extracted in the calling process by pages_per_chunk, like the ranges of the workers.
+        chunk = []
+        for page_text in page_texts:
+            chunk.append(page_text)
+            if len(chunk) == self.pages_per_chunk:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def __imap(self, function: Callable, tasks: list, file_path: str) -> Iterator:
+        # Runs function on each of the tasks in the pool, and returns an iterator over the results in order. At most
+        # TASKS_AHEAD_PER_WORKER tasks per worker are submitted ahead of the results consumed. Fails when waiting for
+        # the results takes longer than timeout_seconds altogether.
+        pool = self.__get_pool()
+        tasks = iter(tasks)
+        async_results = deque()
+        waited_seconds = 0.0
+        while True:
+            while len(async_results) < self.max_workers * TASKS_AHEAD_PER_WORKER:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                async_results.append(pool.apply_async(function, (task,)))
+            if not async_results:
+                return
+            async_result = async_results.popleft()
+            # Wait by intervals, so that a restart of the pool by another extraction fails this one right away
+            # instead of waiting for results that will never come.
+            while not async_result.ready():
+                if self.pool is not pool:
+                    raise Exception(f'The PDF extraction workers were restarted while extracting {file_path}.')
+                if waited_seconds >= self.timeout_seconds:
+                    logging.error(f'Timed out extracting {file_path} after {self.timeout_seconds}s, restarting the '
+                                  f'PDF extraction workers')
+                    self.__restart_pool(pool)
+                    raise Exception(f'Timed out extracting the text of {file_path} after {self.timeout_seconds}s.')
+                wait_start = time.monotonic()
+                async_result.wait(min(POOL_POLL_SECONDS, self.timeout_seconds - waited_seconds))
+                waited_seconds += time.monotonic() - wait_start
+            yield async_result.get()
+
+    def __get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.max_workers)
+            return self.pool
+
+    def __restart_pool(self, pool) -> None:
+        # Terminates the workers still extracting the document. The next extraction starts a new pool.
+        with self.lock:
+            if self.pool is pool:
+                self.pool = None
+        pool.terminate()
+        pool.join()
+
+
+_default_pdf_extractor = None
+_default_pdf_extractor_lock = threading.Lock()
+
+
+def get_default_pdf_extractor() -> PdfExtractor:
+    """
+    Returns the PdfExtractor shared by the readers that are not given one (see read_local_file).
+    """
+    global _default_pdf_extractor
+    with _default_pdf_extractor_lock:
+        if _default_pdf_extractor is None:
+            _default_pdf_extractor = PdfExtractor()
+        return _default_pdf_extractor
@@ -0,0 +1,41 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter.
+
+    The bucket holds at most @capacity tokens and is refilled with @rate tokens per second. Every call takes a token
+    and waits until one is available, so the calls never exceed @rate per second on average and @capacity at once.
+
+    @rate: The number of tokens added per second, e.g. the queries per second allowed by an API.
+    @capacity: The maximum number of tokens, i.e. the size of the bursts. Defaults to max(1, rate).
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise Exception(f'The rate of a TokenBucket must be positive, got {rate}.')
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Takes @tokens tokens from the bucket, waiting until they are available.
+        :return: The number of seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait_seconds = (tokens - self.tokens) / self.rate
+            time.sleep(wait_seconds)
+            waited += wait_seconds
@@ -1,11 +1,20 @@
 import os
-from typing import Tuple
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Iterator, List, Optional, Tuple
 
 import boto3
 import logging
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from s3transfer.compat import seekable
 
 from urllib.parse import urlparse, unquote
 
+from drivers.common.s3_object import S3Object
 from drivers.utilities.config import S3Config
 
 
@@ -29,48 +38,149 @@ def extract_bucket_and_key_from_s3_url(s3_url: str) -> Tuple[str, str]:
     return bucket_name, file_key
 
 
+class FullReadStream:
+    """
+    A read-only binary stream over @stream whose reads return the size asked for, short only at the end of the stream.
+    The reads of a decoded HTTP response (e.g. a urllib3 response) can return fewer bytes than asked for, and
+    s3transfer uploads every read of a non-seekable stream as a part: a short read would upload a part smaller than
+    multipart_chunksize (which S3 rejects unless it is the last one), or the whole stream in one request when the
+    first read is short.
+
+    @stream: The binary stream read.
+    """
+
+    def __init__(self, stream: IO[bytes]):
+        self.stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self.stream.read()
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            chunk = self.stream.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b''.join(chunks)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+
+_shared_client = None
+_shared_transfer_config = None
+_shared_client_lock = threading.Lock()
+# The process that created the shared client.
+_shared_client_pid = None
+# The (bucket, directory) pairs whose directory markers were created by this process.
+_created_directories = set()
+_created_directories_lock = threading.Lock()
+
+
+def _reset_shared_s3_client() -> None:
+    # boto3 clients and their connections are not fork-safe, so a forked process (e.g. a crawl worker) creates its own
+    # client instead of using the one inherited from its parent. The lock may have been held by another thread of the
+    # parent when it forked.
+    global _shared_client, _shared_transfer_config, _shared_client_lock, _shared_client_pid
+    _shared_client = None
+    _shared_transfer_config = None
+    _shared_client_lock = threading.Lock()
+    _shared_client_pid = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_shared_s3_client)
+
+
+def get_shared_s3_client(s3_config: S3Config):
+    """
+    Returns the boto3 S3 client and the TransferConfig shared by all the S3Clients of the process. boto3 clients are
+    thread-safe, so the threads share the client and its pool of S3Config.max_pool_connections connections instead
+    of opening their own. They are not fork-safe: each process creates its own client.
+    """
+    global _shared_client, _shared_transfer_config, _shared_client_pid
+    with _shared_client_lock:
+        if _shared_client is None or _shared_client_pid != os.getpid():
+            _shared_client_pid = os.getpid()
+            session = boto3.session.Session(region_name=s3_config.region_name,
+                                            aws_access_key_id=s3_config.aws_access_key_id,
+                                            aws_secret_access_key=s3_config.aws_secret_access_key)
+            config = Config(max_pool_connections=s3_config.max_pool_connections,
+                            retries={'max_attempts': 5, 'mode': 'standard'},
+                            # The S3-compatible storages rarely support the virtual-hosted-style URLs.
+                            s3={'addressing_style': 'path' if s3_config.endpoint_url else 'auto'})
+            _shared_client = session.client('s3', endpoint_url=s3_config.endpoint_url, config=config)
+            _shared_transfer_config = TransferConfig(multipart_threshold=s3_config.multipart_threshold,
+                                                     multipart_chunksize=s3_config.multipart_chunksize,
+                                                     max_concurrency=s3_config.max_concurrency)
+            # Bound the parts of a non-seekable stream read ahead of the upload (10 by default) to the parts in
+            # flight.
+            _shared_transfer_config.max_in_memory_upload_chunks = s3_config.max_concurrency
+        return _shared_client, _shared_transfer_config
+
+
 class S3Client:
     """
     This class is responsible for storing and retrieving files from S3.
+    The S3Clients share one boto3 client (see get_shared_s3_client), so they are cheap to create and can be used
+    from any thread. An upload costs a single request once the directory markers of its directory were created (see
+    S3Config.create_directory_markers).
     """
 
     def __init__(self):
         self.s3_config = S3Config()
-        self.s3 = boto3.client('s3',
-                               region_name=self.s3_config.region_name,
-                               aws_access_key_id=self.s3_config.aws_access_key_id,
-                               aws_secret_access_key=self.s3_config.aws_secret_access_key)
 
-    # def upload_file(self, src_file_path: int, target_file_path: str):
-    #     logging.info(f'Uploading {src_file_path} to {target_file_path}')
-    #     bucket_name, file_key = extract_bucket_and_key_from_s3_url(target_file_path)
-    #     self.s3.upload_file(src_file_path, bucket_name, file_key)
-    import os
+    @property
+    def s3(self):
+        # Looked up on every use rather than kept, so that an S3Client inherited by a forked process uses the client
+        # of that process.
+        return get_shared_s3_client(self.s3_config)[0]
+
+    @property
+    def transfer_config(self) -> TransferConfig:
+        return get_shared_s3_client(self.s3_config)[1]
 
     def upload_file(self, src_file_path: str, target_file_path: str):
         logging.info(f'Uploading {src_file_path} to {target_file_path}')
         bucket_name, file_key = extract_bucket_and_key_from_s3_url(target_file_path)
+        self.__create_directories(bucket_name, file_key)
 
-        # Extract the directory path from the file key
-        directory_path = os.path.dirname(file_key)
-
-        # Create S3 resource
-        s3_resource = boto3.resource('s3',
-                                     region_name=self.s3_config.region_name,
-                                     aws_access_key_id=self.s3_config.aws_access_key_id,
-                                     aws_secret_access_key=self.s3_config.aws_secret_access_key)
-
-        # Create S3 bucket object
-        bucket = s3_resource.Bucket(bucket_name)
+        # Upload the file to S3
+        self.s3.upload_file(src_file_path, bucket_name, file_key, Config=self.transfer_config)
 
-        # Create directories in S3 recursively
-        for path_part in directory_path.split('/'):
-            if path_part:
-                prefix = file_key[:file_key.index(path_part) + len(path_part)]
-                bucket.put_object(Key=prefix + '/')
+    def upload_fileobj(self, fileobj: IO[bytes], target_file_path: str):
+        """
+        Uploads the bytes read from @fileobj to @target_file_path. The streams larger than the multipart threshold
+        are uploaded in parts while they are read (see S3Config), so they are never held in memory as a whole.
+        """
+        logging.info(f'Uploading a stream to {target_file_path}')
+        bucket_name, file_key = extract_bucket_and_key_from_s3_url(target_file_path)
+        self.__create_directories(bucket_name, file_key)
+        if not seekable(fileobj):
+            # Fill every part up to multipart_chunksize, whatever the size of the reads of the stream.
+            fileobj = FullReadStream(fileobj)
+        self.s3.upload_fileobj(fileobj, bucket_name, file_key, Config=self.transfer_config)
 
-        # Upload the file to S3
-        bucket.upload_file(src_file_path, file_key)
+    def __create_directories(self, bucket_name: str, file_key: str):
+        # Creates the markers of the directories of file_key that this process did not create yet, parents first.
+        if not self.s3_config.create_directory_markers:
+            return
+        prefix = ''
+        for path_part in os.path.dirname(file_key).split('/'):
+            if not path_part:
+                continue
+            prefix = f'{prefix}{path_part}/'
+            with _created_directories_lock:
+                if (bucket_name, prefix) in _created_directories:
+                    continue
+            self.s3.put_object(Bucket=bucket_name, Key=prefix)
+            with _created_directories_lock:
+                _created_directories.add((bucket_name, prefix))
 
     def put_file(self, src_file_name: str, target_file_name: str) -> str:
         logging.info(f'Uploading {src_file_name} to {target_file_name}')
@@ -85,60 +195,170 @@ class S3Client:
         """
         Downloads the file from S3 and returns the name of the downloaded file.
         :param file_name: The name of the file to download.
-        :return: A temporary file name where the file is downloaded.
+        :return: A private temporary file name where the file is downloaded, to be deleted by the caller.
         """
         logging.info(f'Downloading {file_name} from S3')
-
-        if file_name.startswith('s3://'):
-            bucket, file_key = extract_bucket_and_key_from_s3_url(file_name)
-        else:
-            bucket = self.s3_config.bucket_name
-            file_key = file_name
-
+        bucket, file_key = self.__get_bucket_and_key(file_name)
         file_extension = os.path.splitext(file_key)[1]
 
-        # Create a temp file name.
-        tmp_file_name = f'temp{file_extension}'
+        # Create a temp file, unique so that the concurrent downloads do not overwrite each other.
+        fd, tmp_file_name = tempfile.mkstemp(suffix=file_extension)
+        os.close(fd)
         logging.info(f'Downloading {file_key} from S3 bucket {bucket}')
-        self.s3.download_file(bucket, file_key, tmp_file_name)
+        try:
+            self.s3.download_file(bucket, file_key, tmp_file_name, Config=self.transfer_config)
+        except Exception:
+            os.remove(tmp_file_name)
+            raise
         return tmp_file_name
 
+    def get_fileobj(self, file_name: str) -> IO[bytes]:
+        """
+        Downloads the file from S3 to memory, without writing it to the disk unless it is larger than
+        S3Config.in_memory_threshold, in which case it is spilled to a private temporary file.
+        :param file_name: The name of the file to download.
+        :return: A binary file object positioned at the start of the contents, to be closed by the caller.
+        """
+        logging.info(f'Downloading {file_name} from S3 to memory')
+        bucket, file_key = self.__get_bucket_and_key(file_name)
+        fileobj = tempfile.SpooledTemporaryFile(max_size=self.s3_config.in_memory_threshold)
+        try:
+            self.s3.download_fileobj(bucket, file_key, fileobj, Config=self.transfer_config)
+        except Exception:
+            fileobj.close()
+            raise
+        fileobj.seek(0)
+        return fileobj
+
+    def get_range(self, file_name: str, offset: int, length: int) -> bytes:
+        """
+        Downloads @length bytes of the file from S3, starting at @offset, with a single ranged GET.
+        """
+        bucket, file_key = self.__get_bucket_and_key(file_name)
+        response = self.s3.get_object(Bucket=bucket, Key=file_key, Range=f'bytes={offset}-{offset + length - 1}')
+        return response['Body'].read()
+
+    def __get_bucket_and_key(self, file_name: str) -> Tuple[str, str]:
+        if file_name.startswith('s3://'):
+            return extract_bucket_and_key_from_s3_url(file_name)
+        return self.s3_config.bucket_name, file_name
+
     def list_files(self, s3_path: str) -> list:
         """
         List all files in the given S3 path.
         :param s3_path: The path of the directory on S3.
         :return: The list of file names.
         """
-        parsed_url = urlparse(s3_path)
-        bucket_name = parsed_url.netloc
-        prefix = parsed_url.path.lstrip('/')
-        result = self.s3.list_objects(Bucket=bucket_name, Prefix=prefix)
+        return list(self.iter_files(s3_path))
+
+    def iter_files(self, s3_path: str) -> Iterator[str]:
+        """
+        Lists all the files in the given S3 path lazily, its subdirectories in parallel (see iter_objects_parallel).
+        :param s3_path: The path of the directory on S3.
+        :return: An iterator over the file names, relative to the directory, in no particular order.
+        """
+        bucket_name, prefix = extract_bucket_and_key_from_s3_url(s3_path)
+        # List the directory itself, not the other keys starting with its name.
+        prefix = f'{prefix.rstrip("/")}/' if prefix.strip('/') else ''
+        for s3_object in self.iter_objects_parallel(bucket_name, prefix):
+            file_name = s3_object.key
+            if file_name != prefix and not file_name.endswith('/'):  # Exclude the directory markers
+                # Remove the directory name from the file name
+                yield file_name.replace(prefix, '', 1).lstrip('/')
+
+    def list_keys(self, bucket_name: str, prefix: str, delimiter: Optional[str] = None) -> Iterator[str]:
+        """
+        Lists the keys of all the objects of @bucket_name starting with @prefix, 1000 per request.
+        :param delimiter: When set, e.g. to '/', only the keys without @delimiter after @prefix are listed (the files
+        of the directory @prefix, not of its subdirectories).
+        """
+        for s3_object in self.iter_objects(bucket_name, prefix, delimiter):
+            yield s3_object.key
+
+    def iter_objects(self, bucket_name: str, prefix: str = '', delimiter: Optional[str] = None) -> Iterator[S3Object]:
+        """
+        Lists all the objects of @bucket_name starting with @prefix lazily, 1000 per request.
+        :param delimiter: When set, e.g. to '/', only the keys without @delimiter after @prefix are listed. S3 rolls
+        the others up into common prefixes, which are skipped, so the listing costs O(files in the directory).
+        :return: An iterator over the objects, in the order of their keys.
+        """
+        paginator = self.s3.get_paginator('list_objects_v2')
+        paginate_kwargs = {'Delimiter': delimiter} if delimiter else {}
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, **paginate_kwargs):
+            for obj in page.get('Contents', []):
+                yield S3Object.from_listing(bucket_name, obj)
 
-        # Check if the prefix is a directory.
-        # If it is, remove the directory name from the file names.
-        files = []
-        if result.get('Contents'):
-            for file in result.get('Contents'):
-                file_name = file.get('Key')
-                if file_name != prefix:  # Exclude the directory name
-                    # Remove the directory name from the file name
-                    file_name = file_name.replace(prefix, '', 1).lstrip('/')
-                    files.append(file_name)
+    def iter_objects_parallel(self, bucket_name: str, prefix: str = '', max_workers: int = 8,
+                              delimiter: str = '/') -> Iterator[S3Object]:
+        """
+        Lists all the objects of @bucket_name starting with @prefix, listing the sub-prefixes of @prefix (the
+        directories when @delimiter is '/') in parallel. Only a few pages of each listing are read ahead of the
+        objects consumed, so the listing stays lazy.
+        :param max_workers: The number of sub-prefixes listed at the same time.
+        :return: An iterator over the objects, in no particular order.
+        """
+        sub_prefixes = []
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter=delimiter):
+            for obj in page.get('Contents', []):
+                yield S3Object.from_listing(bucket_name, obj)
+            sub_prefixes.extend(common_prefix['Prefix'] for common_prefix in page.get('CommonPrefixes', []))
+        if not sub_prefixes:
+            return
+        logging.info(f'Listing {len(sub_prefixes)} prefixes of s3://{bucket_name}/{prefix} in parallel')
+        # The pages listed by the workers, then None once a sub-prefix is listed.
+        pages = queue.Queue(maxsize=max_workers * 2)
+        stopped = threading.Event()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.__list_prefix, bucket_name, sub_prefix, pages, stopped)
+                       for sub_prefix in sub_prefixes]
+            try:
+                num_listed = 0
+                while num_listed < len(sub_prefixes):
+                    page = pages.get()
+                    if page is None:
+                        num_listed += 1
+                        continue
+                    yield from page
+            finally:
+                # Release the workers when the iteration is abandoned or fails.
+                stopped.set()
+        for future in futures:
+            # Raise the error of a failed listing, if any.
+            future.result()
 
-        return files
+    def __list_prefix(self, bucket_name: str, prefix: str, pages: queue.Queue, stopped: threading.Event) -> None:
+        try:
+            paginator = self.s3.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+                objects = [S3Object.from_listing(bucket_name, obj) for obj in page.get('Contents', [])]
+                if not self.__put_page(pages, objects, stopped):
+                    return
+        finally:
+            self.__put_page(pages, None, stopped)
+
+    @staticmethod
+    def __put_page(pages: queue.Queue, page: Optional[List[S3Object]], stopped: threading.Event) -> bool:
+        # Waits for room in the queue, unless the iteration was stopped. Returns whether the page was queued.
+        while not stopped.is_set():
+            try:
+                pages.put(page, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
 
     def exists(self, s3_location: str) -> bool:
         try:
-            s3 = boto3.resource('s3')
             # Extract S3 bucket and key from file_location
             bucket_name, key = extract_bucket_and_key_from_s3_url(s3_location)
-            # Check if the bucket exists.
-            if not s3.Bucket(bucket_name) in s3.buckets.all():
-                logging.warning(f"Bucket {bucket_name} does not exist.")
-                return False
-            bucket = s3.Bucket(bucket_name)
-            objs = list(bucket.objects.filter(Prefix=key))
-            return len(objs) > 0 and objs[0].key == key
+            # A single HEAD request: 404 when the object (or the bucket) does not exist.
+            self.s3.head_object(Bucket=bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NoSuchBucket'):
+                logging.error(f"Error while checking if file exists: {e}")
+            return False
         except Exception as e:
             logging.error(f"Error while checking if file exists: {e}")
             return False
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """
+    Returns the normalized form of a search query, so that the queries differing only by their case or their
+    whitespace share a cache entry.
+    """
+    return ' '.join(query.lower().split())
+
+
+class SearchCache:
+    """
+    A persistent cache of search results, stored in a SQLite database on the local disk.
+
+    The entries are keyed by endpoint, market and normalized query, and expire @ttl_seconds after they were stored.
+    The expired entries are kept, so that they can still be served when the search API fails (see get_stale()).
+    When the cache holds more than @max_entries entries, the least recently used ones are evicted.
+    The cache is thread-safe and counts its hits, misses, stale hits and evictions.
+
+    @path: The path of the SQLite database.
+    @ttl_seconds: The time to live of an entry.
+    @max_entries: The maximum number of entries.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 30 * 24 * 3600, max_entries: int = 100000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS search_results ('
+                                'key TEXT PRIMARY KEY, endpoint TEXT, market TEXT, query TEXT, results TEXT, '
+                                'created_at REAL, accessed_at REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS search_results_accessed_at '
+                                'ON search_results (accessed_at)')
+        self.connection.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM search_results').fetchone()[0]
+
+    def get(self, endpoint: str, market: str, query: str) -> Optional[List[dict]]:
+        """
+        Returns the results of @query if they are cached and did not expire, None otherwise.
+        """
+        entry = self.__get_entry(endpoint, market, query)
+        with self.lock:
+            if entry is None or time.time() - entry[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+
+    def get_stale(self, endpoint: str, market: str, query: str) -> Optional[List[dict]]:
+        """
+        Returns the results of @query if they are cached, even if they expired, None otherwise.
+        """
+        entry = self.__get_entry(endpoint, market, query)
+        if entry is None:
+            return None
+        with self.lock:
+            self.stale_hits += 1
+        return entry[0]
+
+    def put(self, endpoint: str, market: str, query: str, results: List[dict]) -> None:
+        now = time.time()
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (self.__get_key(endpoint, market, query), endpoint, market,
+                                     normalize_query(query), json.dumps(results), now, now))
+            self.__evict()
+            self.connection.commit()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'stale_hits': self.stale_hits,
+                    'evictions': self.evictions}
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def __get_entry(self, endpoint: str, market: str, query: str) -> Optional[Tuple[List[dict], float]]:
+        key = self.__get_key(endpoint, market, query)
+        with self.lock:
+            row = self.connection.execute('SELECT results, created_at FROM search_results WHERE key = ?',
+                                          (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute('UPDATE search_results SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            logging.error(f'Ignoring the unreadable search cache entry of {query}')
+            return None
+
+    def __evict(self):
+        # Evict the least recently used entries over max_entries. Called with the lock held.
+        count = self.connection.execute('SELECT COUNT(*) FROM search_results').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self.connection.execute('DELETE FROM search_results WHERE key IN ('
+                                'SELECT key FROM search_results ORDER BY accessed_at LIMIT ?)',
+                                (count - self.max_entries,))
+        self.evictions += count - self.max_entries
+
+    @staticmethod
+    def __get_key(endpoint: str, market: str, query: str) -> str:
+        return hashlib.sha1(f'{endpoint}|{market}|{normalize_query(query)}'.encode('utf-8')).hexdigest()
@@ -0,0 +1,258 @@
+# Fixes error "Alternative syntax for unions requires Python 3.10 or newer"
+from __future__ import annotations
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+from urllib.parse import urlparse
+
+from drivers.utilities.s3_client import S3Client
+
+# The size of the chunks copied from a stream to a file.
+COPY_CHUNK_SIZE = 1024 * 1024
+# The directory of the files stored under memory:// (see MemoryStorageBackend), on a memory file system when there is
+# one.
+MEMORY_STORAGE_DIR = os.environ.get(
+    'MEMORY_STORAGE_DIR',
+    os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'decover-memory-storage'))
+
+
+def get_storage_scheme(path: str) -> str:
+    """
+    Returns the URI scheme of @path, which selects its StorageBackend: 's3' for s3://bucket/key, 'memory' for
+    memory://name/key and 'file' for the local paths, with or without file://.
+    """
+    scheme = urlparse(path).scheme
+    return scheme if scheme else 'file'
+
+
+class StorageBackend:
+    """
+    Stores the files under the paths of one URI scheme (see get_storage_scheme). The paths are passed with their
+    scheme, e.g. s3://bucket/key.
+    """
+
+    def write(self, contents: str | bytes, path: str) -> None:
+        raise NotImplementedError
+
+    def write_stream(self, stream: IO[bytes], path: str) -> None:
+        """
+        Writes the bytes read from @stream to @path, chunk by chunk.
+        """
+        raise NotImplementedError
+
+    def open(self, path: str) -> IO[bytes]:
+        """
+        Opens @path for reading.
+        :return: A binary file object, to be closed by the caller.
+        """
+        raise NotImplementedError
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        """
+        Reads @length bytes of @path, starting at @offset.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def local_copy(self, path: str) -> Iterator[str]:
+        """
+        Provides a path on the local file system with the contents of @path, e.g. for the readers that need a path,
+        removed when the context exits.
+        """
+        fd, tmp_file_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1])
+        try:
+            with os.fdopen(fd, 'wb') as f, self.open(path) as source:
+                shutil.copyfileobj(source, f, COPY_CHUNK_SIZE)
+            yield tmp_file_path
+        finally:
+            os.remove(tmp_file_path)
+
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, path: str) -> None:
+        raise NotImplementedError
+
+    def iter_files(self, directory: str) -> Iterator[str]:
+        """
+        Lists the files under @directory, including those of its subdirectories.
+        :return: An iterator over the file names, relative to @directory.
+        """
+        raise NotImplementedError
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Stores the files on the local file system.
+    """
+
+    def write(self, contents: str | bytes, path: str) -> None:
+        path = self.__to_local_path(path)
+        # Check if the directory exists. If not create it.
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        if isinstance(contents, bytes):
+            with open(path, 'wb') as f:
+                f.write(contents)
+        else:
+            with open(path, 'w') as f:
+                f.write(contents)
+
+    def write_stream(self, stream: IO[bytes], path: str) -> None:
+        path = self.__to_local_path(path)
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # Write to a partial file first, so that a failed download never leaves a truncated file behind.
+        partial_file_path = f'{path}.part'
+        try:
+            with open(partial_file_path, 'wb') as f:
+                shutil.copyfileobj(stream, f, COPY_CHUNK_SIZE)
+        except Exception:
+            if os.path.exists(partial_file_path):
+                os.remove(partial_file_path)
+            raise
+        os.replace(partial_file_path, path)
+
+    def open(self, path: str) -> IO[bytes]:
+        return open(self.__to_local_path(path), 'rb')
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        with open(self.__to_local_path(path), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    @contextmanager
+    def local_copy(self, path: str) -> Iterator[str]:
+        # The file is already local.
+        yield self.__to_local_path(path)
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(self.__to_local_path(path))
+
+    def delete(self, path: str) -> None:
+        path = self.__to_local_path(path)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def iter_files(self, directory: str) -> Iterator[str]:
+        directory = self.__to_local_path(directory)
+        for root, _, file_names in os.walk(directory):
+            for file_name in file_names:
+                yield os.path.relpath(os.path.join(root, file_name), directory)
+
+    @staticmethod
+    def __to_local_path(path: str) -> str:
+        return urlparse(path).path if path.startswith('file://') else path
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Stores the files on S3, or on an S3-compatible endpoint (see S3Config.endpoint_url).
+    The files are uploaded and downloaded through memory, the large streams in parts (see S3Client).
+
+    @s3_client: The S3Client used to access S3.
+    """
+
+    def __init__(self, s3_client: Optional[S3Client] = None):
+        self.s3_client = s3_client if s3_client else S3Client()
+
+    def write(self, contents: str | bytes, path: str) -> None:
+        # Upload the contents from memory, without a copy on the disk.
+        if isinstance(contents, str):
+            contents = contents.encode('utf-8')
+        self.s3_client.upload_fileobj(io.BytesIO(contents), path)
+
+    def write_stream(self, stream: IO[bytes], path: str) -> None:
+        self.s3_client.upload_fileobj(stream, path)
+
+    def open(self, path: str) -> IO[bytes]:
+        return self.s3_client.get_fileobj(path)
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        return self.s3_client.get_range(path, offset, length)
+
+    @contextmanager
+    def local_copy(self, path: str) -> Iterator[str]:
+        tmp_file_path = self.s3_client.get_file(path)
+        try:
+            yield tmp_file_path
+        finally:
+            os.remove(tmp_file_path)
+
+    def exists(self, path: str) -> bool:
+        return self.s3_client.exists(path)
+
+    def delete(self, path: str) -> None:
+        raise Exception("Deleting files from S3 is not supported.")
+
+    def iter_files(self, directory: str) -> Iterator[str]:
+        return self.s3_client.iter_files(directory)
+
+
+class MemoryStorageBackend(StorageBackend):
+    """
+    Stores the files in memory, e.g. to run a crawl without any storage service or to measure the cost of the
+    storage. The files are kept in a directory of a memory file system (MEMORY_STORAGE_DIR, /dev/shm by default), so
+    that they are shared by all the processes of the machine, including the crawl workers, and by the successive runs.
+    The input files of a run (e.g. the metadata CSVs) can be copied there beforehand: memory://name/key is stored at
+    MEMORY_STORAGE_DIR/name/key. The files are lost when the machine restarts, or when clear() is called.
+
+    @directory: The directory of the files, MEMORY_STORAGE_DIR by default.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory if directory else MEMORY_STORAGE_DIR
+        self.local_storage_backend = LocalStorageBackend()
+
+    def write(self, contents: str | bytes, path: str) -> None:
+        # Write through a stream, so that the other processes never read a partial file.
+        if isinstance(contents, str):
+            contents = contents.encode('utf-8')
+        self.write_stream(io.BytesIO(contents), path)
+
+    def write_stream(self, stream: IO[bytes], path: str) -> None:
+        self.local_storage_backend.write_stream(stream, self.__to_local_path(path))
+
+    def open(self, path: str) -> IO[bytes]:
+        return self.local_storage_backend.open(self.__to_local_path(path))
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        return self.local_storage_backend.read_range(self.__to_local_path(path), offset, length)
+
+    @contextmanager
+    def local_copy(self, path: str) -> Iterator[str]:
+        with self.local_storage_backend.local_copy(self.__to_local_path(path)) as local_path:
+            yield local_path
+
+    def exists(self, path: str) -> bool:
+        return self.local_storage_backend.exists(self.__to_local_path(path))
+
+    def delete(self, path: str) -> None:
+        self.local_storage_backend.delete(self.__to_local_path(path))
+
+    def iter_files(self, directory: str) -> Iterator[str]:
+        return self.local_storage_backend.iter_files(self.__to_local_path(directory))
+
+    def get_stats(self) -> dict:
+        num_files, num_bytes = 0, 0
+        for root, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                num_files += 1
+                num_bytes += os.path.getsize(os.path.join(root, file_name))
+        return {'files': num_files, 'bytes': num_bytes}
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        logging.info(f'Cleared the in-memory storage {self.directory}')
+
+    def __to_local_path(self, path: str) -> str:
+        parsed_path = urlparse(path)
+        return os.path.join(self.directory, parsed_path.netloc, parsed_path.path.lstrip('/'))
@@ -13,6 +13,7 @@ from db.crawler_run_driver import CrawlerRunDriver
 from db.database import db
 from db.law_elem import LawElemModel
 from db.law_elem_driver import LawElemDriver
+from drivers.crawler.crawl_checkpoint import CrawlCheckpointStore
 from drivers.runners.root_driver import RootDriver
 from drivers.utilities.remove_prefix_middleware import RemovePrefixMiddleware
 
@@ -23,11 +24,32 @@ MAX_PAGES_PER_DOMAIN = 1000
 MAX_LAWS = -1
 # Maximum number of websites to crawl
 MAX_WEBSITES = -1
-# Number of threads to use for the site scraper
+# Number of websites the site scraper crawls at the same time
 MAX_PARALLELISM_SITE_SCRAPER = 10
+# Number of websites crawled at the same time by each crawl worker process of the site scraper
+MAX_CRAWLS_PER_WORKER = 5
+# If INCREMENTAL_CRAWL is set to True, the pages that did not change since the previous run are not uploaded again
+INCREMENTAL_CRAWL = os.environ.get('INCREMENTAL_CRAWL', 'false').lower() == 'true'
+# If PACKED_SITE_OUTPUT is set to True, the pages of each website are packed into a few compressed shards with an index
+# (<website>/shards) instead of one file per page, which saves a request per page on S3
+PACKED_SITE_OUTPUT = os.environ.get('PACKED_SITE_OUTPUT', 'false').lower() == 'true'
+# Number of law PDFs downloaded at the same time, and from the same host at the same time
+MAX_PARALLELISM_LAW_DOWNLOADS = 16
+MAX_LAW_DOWNLOADS_PER_HOST = 4
+# Number of Bing searches in flight at the same time, and the queries per second allowed by our Bing tier
+MAX_PARALLELISM_BING_SEARCH = 8
+BING_SEARCH_QPS = float(os.environ.get('BING_SEARCH_QPS', 3))
+# The persistent cache of the Bing search results, and the number of days the cached results are used for
+BING_SEARCH_CACHE_PATH = os.environ.get('BING_SEARCH_CACHE_PATH', os.path.join(os.getcwd(), 'cache', 'bing_search.db'))
+BING_SEARCH_CACHE_TTL_DAYS = 30
+# The local directory where the website crawls are checkpointed, so that an interrupted crawl resumes where it stopped
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR', os.path.join(os.getcwd(), 'checkpoints'))
 # The time to sleep between runs of the root driver in seconds. Currently set to 1 hour (i.e. 3600 seconds).
 TIME_SLEEP_SECONDS = 60 * 60
-# The base directory where all the files will be stored.
+# The base directory where all the files will be stored: s3://bucket (or an S3-compatible storage, see S3_ENDPOINT_URL),
+# a local directory, or memory://name to keep the files in memory, e.g. to benchmark the crawls offline. The memory://
+# files are shared with the crawl workers through MEMORY_STORAGE_DIR (a /dev/shm directory by default), where the
+# input CSVs (e.g. MEMORY_STORAGE_DIR/name/metadata/site_scraper_input.csv) must be copied before the run.
 BASE_DIR = os.environ.get('BASE_DIR', "s3://decoverlaws")
 # The path to the metadata file for the laws
 LAWS_METADATA_FILE_PATH = f'{BASE_DIR}/metadata/laws_input.csv'
@@ -78,6 +100,16 @@ def trigger_run(scrape_laws: bool = True, scrape_websites: bool = True):
         max_laws=max_laws,
         max_websites=max_websites,
         site_scraper_parallelism=MAX_PARALLELISM_SITE_SCRAPER,
+        crawls_per_worker=MAX_CRAWLS_PER_WORKER,
+        incremental_crawl=INCREMENTAL_CRAWL,
+        checkpoint_dir=CHECKPOINT_DIR,
+        packed_site_output=PACKED_SITE_OUTPUT,
+        law_download_parallelism=MAX_PARALLELISM_LAW_DOWNLOADS,
+        law_downloads_per_host=MAX_LAW_DOWNLOADS_PER_HOST,
+        bing_search_parallelism=MAX_PARALLELISM_BING_SEARCH,
+        bing_search_qps=BING_SEARCH_QPS,
+        bing_search_cache_path=BING_SEARCH_CACHE_PATH,
+        bing_search_cache_ttl_seconds=BING_SEARCH_CACHE_TTL_DAYS * 24 * 3600,
         laws_metadata_file_path=LAWS_METADATA_FILE_PATH,
         site_scraper_metadata_file_path=SITE_SCRAPER_METADATA_FILE_PATH).run()
     logging.info(
@@ -162,6 +194,27 @@ def trigger_run_manually():
     return jsonify({'status': 'ok'})
 
 
+@app.route('/api/v1/checkpoints', methods=['GET'])
+def list_checkpoints():
+    # Lists the checkpoints of the interrupted website crawls
+    return jsonify({'checkpoints': CrawlCheckpointStore(CHECKPOINT_DIR).list_checkpoints()})
+
+
+@app.route('/api/v1/checkpoints', methods=['DELETE'])
+def discard_checkpoints():
+    # Discards the checkpoints older than max_age_hours, their crawls start over. The checkpoints of the crawls still
+    # running are kept.
+    max_age_hours = request.args.get('max_age_hours')
+    if max_age_hours is None:
+        return jsonify({'status': 'error', 'message': 'The max_age_hours parameter is required.'}), 400
+    try:
+        max_age_hours = float(max_age_hours)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': f'Invalid max_age_hours: {max_age_hours}'}), 400
+    discarded = CrawlCheckpointStore(CHECKPOINT_DIR).discard_stale(max_age_hours * 3600)
+    return jsonify({'status': 'ok', 'discarded': discarded})
+
+
 if __name__ == '__main__':
     # Trigger this in a background thread
     t1 = threading.Thread(target=run_root_driver)
@@ -0,0 +1,87 @@
+import io
+import os
+import unittest
+from unittest import mock
+
+from drivers.utilities import s3_client
+from drivers.utilities.s3_client import FullReadStream, S3Client
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+MB = 1024 * 1024
+
+
+class ShortReadStream(io.RawIOBase):
+    """
+    A non-seekable stream returning at most @max_read_size bytes per read, like a decoded urllib3 response.
+    """
+
+    def __init__(self, contents: bytes, max_read_size: int):
+        self.contents = io.BytesIO(contents)
+        self.max_read_size = max_read_size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        chunk = self.contents.read(min(len(b), self.max_read_size))
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+
+class FullReadStreamTest(unittest.TestCase):
+
+    def test_reads_return_the_size_asked_for(self):
+        contents = os.urandom(10000)
+        stream = FullReadStream(ShortReadStream(contents, 7))
+        self.assertEqual(stream.read(4096), contents[:4096])
+        self.assertEqual(stream.read(4096), contents[4096:8192])
+        # Short only at the end of the stream.
+        self.assertEqual(stream.read(4096), contents[8192:])
+        self.assertEqual(stream.read(4096), b'')
+
+    def test_read_all(self):
+        contents = os.urandom(1000)
+        self.assertEqual(FullReadStream(ShortReadStream(contents, 7)).read(), contents)
+
+
+@unittest.skipIf(mock_aws is None, 'moto is not installed')
+class UploadFileobjTest(unittest.TestCase):
+
+    def setUp(self):
+        environ = {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing',
+                   'S3_DEFAULT_REGION': 'us-east-1', 'S3_MULTIPART_THRESHOLD_MB': '5',
+                   'S3_MULTIPART_CHUNK_SIZE_MB': '5', 'S3_CREATE_DIRECTORY_MARKERS': 'false'}
+        patcher = mock.patch.dict(os.environ, environ)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        s3_client._reset_shared_s3_client()
+        self.addCleanup(s3_client._reset_shared_s3_client)
+
+    def test_short_reads_upload_full_parts(self):
+        client = S3Client()
+        client.s3.create_bucket(Bucket='bucket')
+        part_sizes = []
+
+        def record_part_size(params, **kwargs):
+            part_sizes.append(len(params['body'].read()))
+            params['body'].seek(0)
+
+        client.s3.meta.events.register('before-call.s3.UploadPart', record_part_size)
+        contents = os.urandom(12 * MB)
+        client.upload_fileobj(ShortReadStream(contents, 16 * 1024), 's3://bucket/dir/file.bin')
+
+        # The parts are uploaded concurrently.
+        self.assertEqual(sorted(part_sizes), [2 * MB, 5 * MB, 5 * MB])
+        uploaded = client.s3.get_object(Bucket='bucket', Key='dir/file.bin')['Body'].read()
+        self.assertEqual(uploaded, contents)
+
+
+if __name__ == '__main__':
+    unittest.main()